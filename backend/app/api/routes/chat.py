@@ -1,6 +1,13 @@
+import asyncio
+from functools import partial
+from typing import Dict, Optional, Tuple
+import numpy as np
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from app.models.schemas import ChatRequest, ChatResponse, ErrorResponse
-from app.services.rag_service import RAGService
+from app.services.rag_service import rag_service, GENERATION_ERROR_MESSAGE
+from app.services.response_cache import response_cache, semantic_cache
+from app.core.database import sqlite_db
 from app.core.logger import get_logger
 from datetime import datetime
 
@@ -8,7 +15,75 @@ logger = get_logger(__name__)
 
 router = APIRouter(prefix="/api/chat", tags=["Chat"])
 
-rag_service = RAGService()
+SOURCE_SNIPPET_LENGTH = 200
+
+# GZipMiddleware buffers a streamed body inside its compressor until the response ends;
+# an explicit content-encoding makes it pass each chunk straight through
+STREAM_HEADERS = {"Content-Encoding": "identity"}
+
+# Transient status set by the background index task while ChromaDB is being written
+INDEXING_STATUS = "indexing"
+
+
+def _snippet(text: str) -> str:
+    """Truncate source text for the response preview"""
+    if len(text) <= SOURCE_SNIPPET_LENGTH:
+        return text
+    return text[:SOURCE_SNIPPET_LENGTH] + "..."
+
+
+def _validate_query(request: ChatRequest):
+    """Reject queries too short to retrieve against"""
+    if len(request.query.strip()) < 3:
+        raise HTTPException(
+            status_code=400,
+            detail="Query is too short. Please provide a more detailed question."
+        )
+
+
+async def _lookup_cached_answer(request: ChatRequest) -> Tuple[Optional[Dict], Optional[np.ndarray]]:
+    """
+    Look up a cached answer by exact query, then by paraphrase
+    
+    Cached answers are generated without conversation history, so sessions that
+    already have turns (and get them in the prompt) always miss.
+    
+    Returns:
+        Tuple of (cached_result or None, query_embedding for storing a fresh answer)
+    """
+    if await asyncio.to_thread(sqlite_db.get_conversation_history, request.session_id, 1):
+        return None, None
+    
+    cache_key = response_cache.make_key(request.doc_id, request.query)
+    result = response_cache.get(cache_key)
+    if result is not None:
+        return result, None
+    
+    # Fall back to a paraphrase match before paying for retrieval + Gemini
+    return await asyncio.to_thread(semantic_cache.lookup, request.doc_id, request.query)
+
+
+def _cache_answer(request: ChatRequest, query_embedding: Optional[np.ndarray], result: Dict):
+    """
+    Cache a freshly generated answer for later requests
+    
+    Only self-contained answers are cached; the prompt carries recent turns whenever
+    the session has history, so those answers belong to this session alone.
+    """
+    if not result.get("used_history") and result["answer"] != GENERATION_ERROR_MESSAGE:
+        response_cache.set(response_cache.make_key(request.doc_id, request.query), result)
+        semantic_cache.add(request.doc_id, query_embedding, result)
+
+
+async def _ensure_indexed(doc_id: str):
+    """Retrieval against a half-written index would answer without contract context"""
+    status = await asyncio.to_thread(sqlite_db.get_document_status, doc_id)
+    if status == INDEXING_STATUS:
+        raise HTTPException(
+            status_code=409,
+            detail="Document is still being indexed. Please try again in a few seconds."
+        )
+
 
 @router.post("/", response_model=ChatResponse)
 async def chat_with_contract(request: ChatRequest):
@@ -24,18 +99,31 @@ async def chat_with_contract(request: ChatRequest):
     
     try:
         # Validate query length
-        if len(request.query.strip()) < 3:
-            raise HTTPException(
-                status_code=400,
-                detail="Query is too short. Please provide a more detailed question."
-            )
+        _validate_query(request)
         
-        # Answer query using RAG
-        result = rag_service.answer_query(
-            session_id=request.session_id,
-            doc_id=request.doc_id,
-            user_query=request.query
-        )
+        result, query_embedding = await _lookup_cached_answer(request)
+        
+        if result is not None:
+            logger.info(f"Response cache hit for doc {request.doc_id}")
+            await asyncio.to_thread(
+                rag_service.record_turn,
+                request.session_id,
+                request.doc_id,
+                request.query,
+                result["answer"]
+            )
+        else:
+            await _ensure_indexed(request.doc_id)
+            
+            # Answer query using RAG
+            result = await asyncio.to_thread(
+                rag_service.answer_query,
+                session_id=request.session_id,
+                doc_id=request.doc_id,
+                user_query=request.query
+            )
+            
+            _cache_answer(request, query_embedding, result)
         
         # Prepare response
         response = ChatResponse(
@@ -46,7 +134,7 @@ async def chat_with_contract(request: ChatRequest):
             answer=result["answer"],
             sources=[
                 {
-                    "text": source["text"][:200] + "..." if len(source["text"]) > 200 else source["text"],
+                    "text": _snippet(source["text"]),
                     "type": source["type"],
                     "clause_type": source.get("clause_type"),
                     "risk_level": source.get("risk_level")
@@ -68,6 +156,54 @@ async def chat_with_contract(request: ChatRequest):
         raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
 
 
+@router.post("/stream")
+async def stream_chat_with_contract(request: ChatRequest):
+    """
+    Chat with contract, streaming the answer as plain text while Gemini generates it
+    
+    - Same retrieval, history and caching behavior as the JSON chat endpoint (a fully
+      streamed answer is cached like a JSON answer)
+    - The turn is saved to the session history when the stream ends; if the client
+      disconnects mid-answer, the partial answer is saved and nothing is cached
+    """
+    logger.info(f"Streaming chat request: session={request.session_id}, doc={request.doc_id}")
+    
+    try:
+        _validate_query(request)
+        
+        result, query_embedding = await _lookup_cached_answer(request)
+        
+        if result is not None:
+            logger.info(f"Response cache hit for doc {request.doc_id}")
+            await asyncio.to_thread(
+                rag_service.record_turn,
+                request.session_id,
+                request.doc_id,
+                request.query,
+                result["answer"]
+            )
+            chunks = iter([result["answer"]])
+        else:
+            await _ensure_indexed(request.doc_id)
+            
+            chunks = await asyncio.to_thread(
+                rag_service.stream_answer,
+                session_id=request.session_id,
+                doc_id=request.doc_id,
+                user_query=request.query,
+                on_complete=partial(_cache_answer, request, query_embedding)
+            )
+        
+        return StreamingResponse(chunks, media_type="text/plain", headers=STREAM_HEADERS)
+    
+    except HTTPException:
+        raise
+    
+    except Exception as e:
+        logger.error(f"Streaming chat failed: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
+
+
 @router.get("/history/{session_id}")
 async def get_chat_history(session_id: str, limit: int = 10):
     """
@@ -83,9 +219,7 @@ async def get_chat_history(session_id: str, limit: int = 10):
     logger.info(f"Retrieving chat history for session: {session_id}")
     
     try:
-        from app.core.database import sqlite_db
-        
-        history = sqlite_db.get_conversation_history(session_id, limit)
+        history = await asyncio.to_thread(sqlite_db.get_conversation_history, session_id, limit)
         
         logger.info(f"Retrieved {len(history)} conversation turns")
         
@@ -114,14 +248,7 @@ async def clear_session(session_id: str):
     logger.info(f"Clearing session: {session_id}")
     
     try:
-        from app.core.database import sqlite_db
-        
-        conn = sqlite_db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM conversations WHERE session_id = ?", (session_id,))
-        deleted_count = cursor.rowcount
-        conn.commit()
-        conn.close()
+        deleted_count = await asyncio.to_thread(sqlite_db.delete_conversation, session_id)
         
         logger.info(f"Cleared {deleted_count} conversation turns for session {session_id}")
         
@@ -1,7 +1,9 @@
+import asyncio
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import FileResponse
 from pathlib import Path
-from app.services.excel_exporter import ExcelExporter
+from datetime import datetime
+from app.services.excel_exporter import excel_exporter
 from app.core.database import sqlite_db
 from app.core.logger import get_logger
 
@@ -9,7 +11,49 @@ logger = get_logger(__name__)
 
 router = APIRouter(prefix="/api/export", tags=["Export"])
 
-excel_exporter = ExcelExporter()
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def _load_document_row(doc_id: str):
+    """
+    Fetch filename, page count, overall risk and extraction version for a document
+    
+    Every extraction replaces the clause rows with freshly AUTOINCREMENTed ones, so
+    the highest clause row id identifies the current extraction.
+    """
+    with sqlite_db.read_cursor() as cursor:
+        cursor.execute(
+            "SELECT filename, num_pages, overall_risk_score, "
+            "(SELECT MAX(id) FROM extracted_clauses WHERE doc_id = documents.doc_id) "
+            "FROM documents WHERE doc_id = ?",
+            (doc_id,)
+        )
+        return cursor.fetchone()
+
+
+def _load_clause_rows(doc_id: str):
+    """
+    Fetch the extracted clause rows, the extraction version they belong to and
+    per-risk-level counts for a document
+    """
+    with sqlite_db.read_cursor() as cursor:
+        cursor.execute(
+            "SELECT id, clause_type, extracted_text, confidence, risk_score, risk_level, "
+            "page_number, char_start, char_end, reliability_flag FROM extracted_clauses WHERE doc_id = ?",
+            (doc_id,)
+        )
+        rows = cursor.fetchall()
+        
+        cursor.execute(
+            "SELECT risk_level, COUNT(*) FROM extracted_clauses WHERE doc_id = ? GROUP BY risk_level",
+            (doc_id,)
+        )
+        risk_counts = dict(cursor.fetchall())
+    
+    version = max((row[0] for row in rows), default=None)
+    return version, [row[1:] for row in rows], risk_counts
+
 
 @router.get("/{doc_id}")
 async def export_to_excel(doc_id: str):
@@ -25,30 +69,24 @@ async def export_to_excel(doc_id: str):
     
     try:
         # Retrieve document info
-        conn = sqlite_db.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "SELECT filename, num_pages, overall_risk_score FROM documents WHERE doc_id = ?",
-            (doc_id,)
-        )
-        doc_row = cursor.fetchone()
+        doc_row = await asyncio.to_thread(_load_document_row, doc_id)
         
         if not doc_row:
             logger.error(f"Document not found: {doc_id}")
             raise HTTPException(status_code=404, detail="Document not found")
         
-        filename, num_pages, overall_risk_score = doc_row
+        filename, num_pages, overall_risk_score, version = doc_row
+        download_name = f"{filename.replace('.pdf', '')}_analysis.xlsx"
         
-        # Retrieve extracted clauses
-        cursor.execute(
-            "SELECT clause_type, extracted_text, confidence, risk_score, risk_level, "
-            "page_number, char_start, char_end FROM extracted_clauses WHERE doc_id = ?",
-            (doc_id,)
-        )
-        clause_rows = cursor.fetchall()
+        # Serve the cached workbook if it was built from the current extraction
+        if version is not None:
+            cache_path = excel_exporter.cache_path(doc_id, version)
+            if cache_path.exists():
+                logger.info(f"Serving cached export for document: {doc_id}")
+                return FileResponse(path=str(cache_path), media_type=XLSX_MEDIA_TYPE, filename=download_name)
         
-        conn.close()
+        # Retrieve extracted clauses
+        version, clause_rows, risk_counts = await asyncio.to_thread(_load_clause_rows, doc_id)
         
         if not clause_rows:
             logger.error(f"No extraction results found for document: {doc_id}")
@@ -59,24 +97,16 @@ async def export_to_excel(doc_id: str):
         
         # Prepare extraction result dictionary
         clauses = []
-        high_risk_count = 0
-        medium_risk_count = 0
-        low_risk_count = 0
         missing_critical_count = 0
         
         for row in clause_rows:
-            clause_type, extracted_text, confidence, risk_score, risk_level, page_number, char_start, char_end = row
+            (clause_type, extracted_text, confidence, risk_score, risk_level,
+             page_number, char_start, char_end, reliability_flag) = row
             
             found = extracted_text is not None
-            reliability_flag = None
-            
-            if not found and risk_score >= 60:
-                reliability_flag = "MISSING_CRITICAL"
+            if reliability_flag == "MISSING_CRITICAL":
                 missing_critical_count += 1
             
-            if confidence and confidence < 0.6 and risk_score >= 60:
-                reliability_flag = "REQUIRES_HUMAN_VERIFICATION"
-            
             clauses.append({
                 "clause_type": clause_type,
                 "extracted_text": extracted_text,
@@ -89,13 +119,6 @@ async def export_to_excel(doc_id: str):
                 "char_end": char_end,
                 "reliability_flag": reliability_flag
             })
-            
-            if risk_level == "HIGH":
-                high_risk_count += 1
-            elif risk_level == "MEDIUM":
-                medium_risk_count += 1
-            elif risk_level == "LOW":
-                low_risk_count += 1
         
         # Determine overall risk level
         if overall_risk_score >= 60:
@@ -105,7 +128,6 @@ async def export_to_excel(doc_id: str):
         else:
             risk_level = "LOW"
         
-        from datetime import datetime
         extraction_result = {
             "doc_id": doc_id,
             "filename": filename,
@@ -113,17 +135,19 @@ async def export_to_excel(doc_id: str):
             "overall_risk_score": overall_risk_score,
             "risk_level": risk_level,
             "clauses": clauses,
-            "high_risk_count": high_risk_count,
-            "medium_risk_count": medium_risk_count,
-            "low_risk_count": low_risk_count,
+            "high_risk_count": risk_counts.get("HIGH", 0),
+            "medium_risk_count": risk_counts.get("MEDIUM", 0),
+            "low_risk_count": risk_counts.get("LOW", 0),
             "missing_critical_count": missing_critical_count,
             "timestamp": datetime.now()
         }
         
         # Generate Excel file
         logger.info("Generating Excel file")
-        excel_path = excel_exporter.export_results(
+        excel_path = await asyncio.to_thread(
+            excel_exporter.export_cached,
             doc_id=doc_id,
+            version=version,
             filename=filename,
             extraction_result=extraction_result
         )
@@ -133,8 +157,8 @@ async def export_to_excel(doc_id: str):
         # Return file as download
         return FileResponse(
             path=excel_path,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            filename=f"{filename.replace('.pdf', '')}_analysis.xlsx"
+            media_type=XLSX_MEDIA_TYPE,
+            filename=download_name
         )
     
     except HTTPException:
@@ -1,11 +1,16 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query
 from pathlib import Path
 from app.config import settings
 from app.models.schemas import ExtractionResponse, ClauseExtraction, ErrorResponse
-from app.services.pdf_extractor import PDFExtractor
-from app.services.clause_extractor import ClauseExtractor
-from app.services.risk_scorer import RiskScorer
-from app.services.rag_service import RAGService
+from app.services.pdf_extractor import pdf_extractor
+from app.services.clause_extractor import clause_extractor
+from app.services.risk_scorer import risk_scorer
+from app.services.rag_service import rag_service
+from app.services.excel_exporter import excel_exporter
+from app.services.response_cache import response_cache, semantic_cache
 from app.core.database import sqlite_db
 from app.core.logger import get_logger
 from datetime import datetime
@@ -14,21 +19,280 @@ logger = get_logger(__name__)
 
 router = APIRouter(prefix="/api/extract", tags=["Extraction"])
 
-pdf_extractor = PDFExtractor()
-clause_extractor = ClauseExtractor()
-risk_scorer = RiskScorer()
-rag_service = RAGService()
+# Dedicated pool for the CPU-heavy pipeline so it never runs on the event loop.
+# Threads (not processes) share the already-loaded model weights; torch releases
+# the GIL inside its kernels.
+extraction_executor = ThreadPoolExecutor(
+    max_workers=settings.EXTRACTION_WORKERS,
+    thread_name_prefix="extraction"
+)
+
+# Document statuses that mean extracted_clauses holds a complete result
+EXTRACTED_STATUSES = ("completed", "indexing", "indexed", "index_failed")
+
+
+def _run_extraction(doc_id: str, pdf_path: str):
+    """
+    Run PDF text extraction, clause extraction and risk scoring
+    
+    Args:
+        doc_id: Document identifier
+        pdf_path: Path to the uploaded PDF
+    
+    Returns:
+        Tuple of (contract_text, num_pages, scored_clauses, overall_risk);
+        contract_text is None if text extraction failed
+    """
+    # Extract text with page mapping
+    logger.info("Extracting text from PDF with page mapping")
+    contract_text, char_to_page_map, num_pages, success = pdf_extractor.extract_text_with_page_mapping(
+        pdf_path
+    )
+    
+    if not success or not contract_text:
+        logger.error(f"Text extraction failed for document: {doc_id}")
+        return None, num_pages, None, None
+    
+    logger.info(f"Text extracted: {len(contract_text)} characters, {num_pages} pages")
+    
+    # Extract all clauses
+    logger.info("Starting clause extraction with TinyRoBERTa model")
+    extracted_clauses = clause_extractor.extract_all_clauses(
+        contract_text=contract_text,
+        char_to_page_map=char_to_page_map
+    )
+    
+    logger.info(f"Clause extraction complete: {len(extracted_clauses)} clauses processed")
+    
+    # Score all clauses
+    logger.info("Calculating risk scores")
+    scored_clauses, overall_risk = risk_scorer.score_all_clauses(extracted_clauses)
+    
+    return contract_text, num_pages, scored_clauses, overall_risk
+
+
+def _save_extraction_results(doc_id: str, scored_clauses: dict, overall_risk: float) -> str:
+    """
+    Persist scored clauses and the overall risk score in a single transaction
+    
+    Returns:
+        The document's original filename, read inside the same transaction
+    """
+    rows = [
+        (
+            doc_id,
+            clause_type,
+            clause_info.get("extracted_text"),
+            clause_info.get("confidence"),
+            clause_info.get("risk_score"),
+            clause_info.get("risk_level"),
+            clause_info.get("page_number"),
+            clause_info.get("char_start"),
+            clause_info.get("char_end"),
+            clause_info.get("reliability_flag")
+        )
+        for clause_type, clause_info in scored_clauses.items()
+    ]
+    
+    with sqlite_db.cursor() as cursor:
+        cursor.execute("BEGIN")
+        
+        # Replace rows from any earlier extraction of this document
+        cursor.execute("DELETE FROM extracted_clauses WHERE doc_id = ?", (doc_id,))
+        cursor.executemany('''
+            INSERT INTO extracted_clauses 
+            (doc_id, clause_type, extracted_text, confidence, risk_score, risk_level, 
+             page_number, char_start, char_end, reliability_flag)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        
+        # Update document with overall risk
+        cursor.execute(
+            "UPDATE documents SET overall_risk_score = ?, status = ? WHERE doc_id = ?",
+            (overall_risk, "completed", doc_id)
+        )
+        
+        cursor.execute("SELECT filename FROM documents WHERE doc_id = ?", (doc_id,))
+        row = cursor.fetchone()
+    
+    return row[0] if row else "unknown.pdf"
+
+
+def _load_cached_extraction(doc_id: str):
+    """
+    Load a finished extraction from SQLite
+    
+    Returns:
+        Tuple of (status, filename, num_pages, overall_risk, scored_clauses), or None
+        if the document has not been extracted yet
+    """
+    with sqlite_db.read_cursor() as cursor:
+        cursor.execute(
+            "SELECT status, filename, num_pages, overall_risk_score FROM documents WHERE doc_id = ?",
+            (doc_id,)
+        )
+        doc_row = cursor.fetchone()
+        
+        if not doc_row or doc_row[0] not in EXTRACTED_STATUSES or doc_row[3] is None:
+            return None
+        
+        cursor.execute(
+            "SELECT clause_type, extracted_text, confidence, risk_score, risk_level, "
+            "page_number, char_start, char_end, reliability_flag FROM extracted_clauses WHERE doc_id = ?",
+            (doc_id,)
+        )
+        clause_rows = cursor.fetchall()
+    
+    if not clause_rows:
+        return None
+    
+    status, filename, num_pages, overall_risk = doc_row
+    scored_clauses = {}
+    
+    for (clause_type, extracted_text, confidence, risk_score, risk_level,
+         page_number, char_start, char_end, reliability_flag) in clause_rows:
+        found = extracted_text is not None
+        
+        scored_clauses[clause_type] = {
+            "extracted_text": extracted_text,
+            "confidence": confidence or 0.0,
+            "risk_score": risk_score or 0.0,
+            "risk_level": risk_level or "UNKNOWN",
+            "found": found,
+            "page_number": page_number,
+            "char_start": char_start,
+            "char_end": char_end,
+            "reliability_flag": reliability_flag
+        }
+    
+    return status, filename, num_pages, overall_risk, scored_clauses
+
+
+def _build_response(doc_id: str, filename: str, num_pages: int,
+                    overall_risk: float, scored_clauses: dict) -> ExtractionResponse:
+    """Assemble the extraction response from scored clauses"""
+    # Get risk summary
+    risk_summary = risk_scorer.get_risk_summary(scored_clauses)
+    
+    # Determine overall risk level
+    if overall_risk >= 60:
+        risk_level = "HIGH"
+    elif overall_risk >= 30:
+        risk_level = "MEDIUM"
+    else:
+        risk_level = "LOW"
+    
+    logger.info(f"Risk assessment complete: Overall risk = {overall_risk} ({risk_level})")
+    
+    clause_list = []
+    for clause_type, clause_info in scored_clauses.items():
+        clause_list.append(ClauseExtraction(
+            clause_type=clause_type,
+            extracted_text=clause_info.get("extracted_text"),
+            confidence=clause_info.get("confidence", 0.0),
+            risk_score=clause_info.get("risk_score", 0.0),
+            risk_level=clause_info.get("risk_level", "UNKNOWN"),
+            found=clause_info.get("found", False),
+            page_number=clause_info.get("page_number"),
+            char_start=clause_info.get("char_start"),
+            char_end=clause_info.get("char_end"),
+            reliability_flag=clause_info.get("reliability_flag")
+        ))
+    
+    return ExtractionResponse(
+        doc_id=doc_id,
+        filename=filename,
+        overall_risk_score=overall_risk,
+        risk_level=risk_level,
+        num_pages=num_pages,
+        clauses=clause_list,
+        high_risk_count=risk_summary["high_risk_count"],
+        medium_risk_count=risk_summary["medium_risk_count"],
+        low_risk_count=risk_summary["low_risk_count"],
+        missing_critical_count=risk_summary["missing_critical_count"],
+        timestamp=datetime.now()
+    )
+
+
+async def _mark_failed(doc_id: str, status: str = "failed"):
+    """Record a failed processing status without masking the original error"""
+    try:
+        await asyncio.to_thread(sqlite_db.update_document_status, doc_id, status)
+    except Exception as e:
+        logger.warning(f"Could not set status '{status}' for document {doc_id}: {str(e)}")
+
+
+async def _index_document_in_background(doc_id: str, contract_text: str, scored_clauses: dict):
+    """
+    Index a document in ChromaDB after the extraction response has been sent
+    
+    Holds the document in 'indexing' (chat waits on it) while the index is written,
+    then marks it 'indexed' on success (or 'index_failed') and drops cached chat
+    answers so they are regenerated against the fresh index.
+    """
+    loop = asyncio.get_running_loop()
+    
+    try:
+        await asyncio.to_thread(sqlite_db.update_document_status, doc_id, "indexing")
+        logger.info(f"Indexing document {doc_id} in ChromaDB for RAG (background)")
+        await loop.run_in_executor(
+            extraction_executor,
+            partial(
+                rag_service.index_document,
+                doc_id=doc_id,
+                contract_text=contract_text,
+                extracted_clauses=scored_clauses
+            )
+        )
+        
+        response_cache.invalidate_document(doc_id)
+        semantic_cache.invalidate_document(doc_id)
+        await asyncio.to_thread(sqlite_db.update_document_status, doc_id, "indexed")
+        logger.info(f"Background indexing complete for document: {doc_id}")
+    
+    except Exception as e:
+        logger.error(f"Background indexing failed for document {doc_id}: {str(e)}", exc_info=True)
+        await _mark_failed(doc_id, "index_failed")
+
+
+async def _reindex_document_in_background(doc_id: str, pdf_path: str, scored_clauses: dict):
+    """
+    Rebuild the ChromaDB index for stored extraction results whose index failed or
+    was never built (e.g. extracted before background indexing, or lost on restart)
+    """
+    loop = asyncio.get_running_loop()
+    
+    try:
+        contract_text, _, _, success = await loop.run_in_executor(
+            extraction_executor, pdf_extractor.extract_text_with_page_mapping, pdf_path
+        )
+    except Exception as e:
+        logger.error(f"Text extraction for re-indexing failed for document {doc_id}: {str(e)}", exc_info=True)
+        contract_text, success = None, False
+    
+    if not success or not contract_text:
+        await _mark_failed(doc_id, "index_failed")
+        return
+    
+    await _index_document_in_background(doc_id, contract_text, scored_clauses)
+
 
 @router.post("/{doc_id}", response_model=ExtractionResponse)
-async def extract_clauses(doc_id: str):
+async def extract_clauses(
+    doc_id: str,
+    background_tasks: BackgroundTasks,
+    force: bool = Query(False, description="Re-run extraction even if results already exist")
+):
     """
     Extract all clauses from uploaded contract and calculate risk scores
     
+    - Returns stored results if the document was already extracted (unless force=true),
+      rebuilding its index in the background if that is missing
     - Extracts text from PDF with page mapping
     - Runs TinyRoBERTa model to extract 41 clause types
     - Calculates risk scores for each clause
     - Computes overall contract risk
-    - Indexes document in ChromaDB for RAG
+    - Indexes document in ChromaDB for RAG in the background (status becomes 'indexed')
     - Returns comprehensive extraction results
     """
     logger.info(f"Starting clause extraction for document: {doc_id}")
@@ -41,134 +305,45 @@ async def extract_clauses(doc_id: str):
             logger.error(f"Document not found: {doc_id}")
             raise HTTPException(status_code=404, detail="Document not found")
         
+        # Serve a previous extraction without re-running the pipeline
+        if not force:
+            cached = await asyncio.to_thread(_load_cached_extraction, doc_id)
+            if cached is not None:
+                logger.info(f"Returning stored extraction results for document: {doc_id}")
+                status, filename, num_pages, overall_risk, scored_clauses = cached
+                
+                if status not in ("indexed", "indexing"):
+                    logger.info(f"Re-indexing document {doc_id} (status '{status}') in the background")
+                    background_tasks.add_task(_reindex_document_in_background, doc_id, str(pdf_path), scored_clauses)
+                
+                return _build_response(doc_id, filename, num_pages, overall_risk, scored_clauses)
+        
         # Update status to processing
-        conn = sqlite_db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE documents SET status = ? WHERE doc_id = ?",
-            ("processing", doc_id)
-        )
-        conn.commit()
-        conn.close()
+        await asyncio.to_thread(sqlite_db.update_document_status, doc_id, "processing")
         
-        # Extract text with page mapping
-        logger.info("Extracting text from PDF with page mapping")
-        contract_text, char_to_page_map, num_pages, success = pdf_extractor.extract_text_with_page_mapping(
-            str(pdf_path)
+        # Run extraction pipeline off the event loop
+        loop = asyncio.get_running_loop()
+        contract_text, num_pages, scored_clauses, overall_risk = await loop.run_in_executor(
+            extraction_executor, _run_extraction, doc_id, str(pdf_path)
         )
         
-        if not success or not contract_text:
-            logger.error(f"Text extraction failed for document: {doc_id}")
+        if contract_text is None:
+            await _mark_failed(doc_id)
             raise HTTPException(
                 status_code=500,
                 detail="Failed to extract text from PDF"
             )
         
-        logger.info(f"Text extracted: {len(contract_text)} characters, {num_pages} pages")
-        
-        # Extract all clauses
-        logger.info("Starting clause extraction with TinyRoBERTa model")
-        extracted_clauses = clause_extractor.extract_all_clauses(
-            contract_text=contract_text,
-            char_to_page_map=char_to_page_map
-        )
-        
-        logger.info(f"Clause extraction complete: {len(extracted_clauses)} clauses processed")
-        
-        # Score all clauses
-        logger.info("Calculating risk scores")
-        scored_clauses, overall_risk = risk_scorer.score_all_clauses(extracted_clauses)
-        
-        # Get risk summary
-        risk_summary = risk_scorer.get_risk_summary(scored_clauses)
-        
-        # Determine overall risk level
-        if overall_risk >= 60:
-            risk_level = "HIGH"
-        elif overall_risk >= 30:
-            risk_level = "MEDIUM"
-        else:
-            risk_level = "LOW"
-        
-        logger.info(f"Risk assessment complete: Overall risk = {overall_risk} ({risk_level})")
-        
         # Save extracted clauses to database
         logger.info("Saving extraction results to database")
-        conn = sqlite_db.get_connection()
-        cursor = conn.cursor()
-        
-        for clause_type, clause_info in scored_clauses.items():
-            cursor.execute('''
-                INSERT INTO extracted_clauses 
-                (doc_id, clause_type, extracted_text, confidence, risk_score, risk_level, 
-                 page_number, char_start, char_end)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                doc_id,
-                clause_type,
-                clause_info.get("extracted_text"),
-                clause_info.get("confidence"),
-                clause_info.get("risk_score"),
-                clause_info.get("risk_level"),
-                clause_info.get("page_number"),
-                clause_info.get("char_start"),
-                clause_info.get("char_end")
-            ))
+        filename = await asyncio.to_thread(_save_extraction_results, doc_id, scored_clauses, overall_risk)
+        excel_exporter.invalidate_cache(doc_id)
         
-        # Update document with overall risk
-        cursor.execute(
-            "UPDATE documents SET overall_risk_score = ?, status = ? WHERE doc_id = ?",
-            (overall_risk, "completed", doc_id)
-        )
-        
-        conn.commit()
-        conn.close()
-        
-        # Index document in ChromaDB for RAG
-        logger.info("Indexing document in ChromaDB for RAG")
-        rag_service.index_document(
-            doc_id=doc_id,
-            contract_text=contract_text,
-            extracted_clauses=scored_clauses
-        )
-        
-        # Get original filename
-        conn = sqlite_db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT filename FROM documents WHERE doc_id = ?", (doc_id,))
-        row = cursor.fetchone()
-        filename = row[0] if row else "unknown.pdf"
-        conn.close()
+        # Index document in ChromaDB for RAG once the response has been sent
+        background_tasks.add_task(_index_document_in_background, doc_id, contract_text, scored_clauses)
         
         # Prepare response
-        clause_list = []
-        for clause_type, clause_info in scored_clauses.items():
-            clause_list.append(ClauseExtraction(
-                clause_type=clause_type,
-                extracted_text=clause_info.get("extracted_text"),
-                confidence=clause_info.get("confidence", 0.0),
-                risk_score=clause_info.get("risk_score", 0.0),
-                risk_level=clause_info.get("risk_level", "UNKNOWN"),
-                found=clause_info.get("found", False),
-                page_number=clause_info.get("page_number"),
-                char_start=clause_info.get("char_start"),
-                char_end=clause_info.get("char_end"),
-                reliability_flag=clause_info.get("reliability_flag")
-            ))
-        
-        response = ExtractionResponse(
-            doc_id=doc_id,
-            filename=filename,
-            overall_risk_score=overall_risk,
-            risk_level=risk_level,
-            num_pages=num_pages,
-            clauses=clause_list,
-            high_risk_count=risk_summary["high_risk_count"],
-            medium_risk_count=risk_summary["medium_risk_count"],
-            low_risk_count=risk_summary["low_risk_count"],
-            missing_critical_count=risk_summary["missing_critical_count"],
-            timestamp=datetime.now()
-        )
+        response = _build_response(doc_id, filename, num_pages, overall_risk, scored_clauses)
         
         logger.info(f"Extraction complete for document: {doc_id}")
         
@@ -181,16 +356,6 @@ async def extract_clauses(doc_id: str):
         logger.error(f"Extraction failed: {str(e)}", exc_info=True)
         
         # Update status to failed
-        try:
-            conn = sqlite_db.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE documents SET status = ? WHERE doc_id = ?",
-                ("failed", doc_id)
-            )
-            conn.commit()
-            conn.close()
-        except:
-            pass
+        await _mark_failed(doc_id)
         
         raise HTTPException(status_code=500, detail=f"Extraction failed: {str(e)}")
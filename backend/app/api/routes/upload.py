@@ -1,10 +1,11 @@
+import asyncio
 from fastapi import APIRouter, UploadFile, File, HTTPException
 from pathlib import Path
 import uuid
-import shutil
+import aiofiles
 from app.config import settings
 from app.models.schemas import UploadResponse, ErrorResponse
-from app.services.pdf_extractor import PDFExtractor
+from app.services.pdf_extractor import pdf_extractor
 from app.core.database import sqlite_db
 from app.core.logger import get_logger
 
@@ -12,7 +13,7 @@ logger = get_logger(__name__)
 
 router = APIRouter(prefix="/api/upload", tags=["Upload"])
 
-pdf_extractor = PDFExtractor()
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1MB
 
 @router.post("/", response_model=UploadResponse)
 async def upload_contract(file: UploadFile = File(...)):
@@ -41,15 +42,17 @@ async def upload_contract(file: UploadFile = File(...)):
         # Save uploaded file
         upload_path = Path(settings.UPLOAD_DIR) / f"{doc_id}.pdf"
         
-        with open(upload_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        async with aiofiles.open(upload_path, "wb") as buffer:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                await buffer.write(chunk)
         
         file_size = upload_path.stat().st_size
         
         logger.info(f"File saved: {upload_path} ({file_size} bytes)")
         
-        # Validate PDF
-        is_valid, error_msg = pdf_extractor.validate_pdf(
+        # Validate PDF and get page count in a single parse
+        is_valid, num_pages, error_msg = await asyncio.to_thread(
+            pdf_extractor.validate_and_probe,
             str(upload_path),
             max_size_mb=settings.MAX_FILE_SIZE_MB
         )
@@ -60,25 +63,10 @@ async def upload_contract(file: UploadFile = File(...)):
             logger.error(f"PDF validation failed: {error_msg}")
             raise HTTPException(status_code=400, detail=error_msg)
         
-        # Quick extraction to get page count
-        _, num_pages, success = pdf_extractor.extract_text_from_pdf(str(upload_path))
-        
-        if not success:
-            logger.error(f"Failed to extract text from PDF: {doc_id}")
-            raise HTTPException(
-                status_code=400,
-                detail="Failed to extract text from PDF. File may be corrupted or scanned."
-            )
-        
         # Save document metadata to database
-        conn = sqlite_db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO documents (doc_id, filename, num_pages, status) VALUES (?, ?, ?, ?)",
-            (doc_id, file.filename, num_pages, "uploaded")
+        await asyncio.to_thread(
+            sqlite_db.insert_document, doc_id, file.filename, num_pages, "uploaded"
         )
-        conn.commit()
-        conn.close()
         
         logger.info(f"Document uploaded successfully: {doc_id}")
         
@@ -22,6 +22,8 @@ class Settings:
     APP_NAME: str = os.getenv("APP_NAME", "ContractIQ")
     APP_VERSION: str = os.getenv("APP_VERSION", "1.0.0")
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    CORS_ALLOWED_ORIGINS: list = os.getenv("CORS_ALLOWED_ORIGINS", "*").split(",")
+    GZIP_MIN_SIZE: int = int(os.getenv("GZIP_MIN_SIZE", "1024"))
     
     # File Upload Settings
     MAX_FILE_SIZE_MB: int = int(os.getenv("MAX_FILE_SIZE_MB", "10"))
@@ -33,20 +35,69 @@ class Settings:
     NULL_THRESHOLD: float = float(os.getenv("NULL_THRESHOLD", "0.0"))
     N_BEST: int = 5
     MAX_ANSWER_LENGTH: int = 200
+    EXTRACTION_WORKERS: int = int(os.getenv("EXTRACTION_WORKERS", "1"))
+    # Shard the 41 questions across this many model-owning processes (0/1 = in-process)
+    EXTRACTION_PROCESSES: int = int(os.getenv("EXTRACTION_PROCESSES", "0"))
+    # Recently tokenized contracts kept for re-extraction (0 disables)
+    TOKENIZATION_CACHE_SIZE: int = int(os.getenv("TOKENIZATION_CACHE_SIZE", "8"))
+    # Parse large PDFs in blocks of pages across this many processes (0/1 = serial)
+    PDF_EXTRACTION_WORKERS: int = int(os.getenv("PDF_EXTRACTION_WORKERS", "0"))
+    PDF_PAGE_BLOCK_SIZE: int = int(os.getenv("PDF_PAGE_BLOCK_SIZE", "10"))
+    # Text extraction backend: "pdfminer" (default) or "pdfium" (requires pypdfium2)
+    PDF_BACKEND: str = os.getenv("PDF_BACKEND", "pdfminer").lower()
+    INFERENCE_THREADS: int = int(os.getenv("INFERENCE_THREADS", str(os.cpu_count() or 1)))
+    # Chunks per forward pass across all questions; 0 picks a per-device default
+    INFERENCE_BATCH_SIZE: int = int(os.getenv("INFERENCE_BATCH_SIZE", "0"))
+    USE_ONNX: bool = os.getenv("USE_ONNX", "true").lower() == "true"
+    # Looked up inside MODEL_PATH; empty means prefer an int8 export, then the FP32 one
+    ONNX_MODEL_FILE: str = os.getenv("ONNX_MODEL_FILE", "")
+    # PyTorch path only: compile with TorchInductor and/or run in bfloat16 instead of
+    # dynamic INT8 quantization (worthwhile on CPUs with AVX-512 BF16 / AMX)
+    TORCH_COMPILE: bool = os.getenv("TORCH_COMPILE", "false").lower() == "true"
+    TORCH_BF16: bool = os.getenv("TORCH_BF16", "false").lower() == "true"
+    # Apply intel_extension_for_pytorch (oneDNN fused kernels) when it is installed
+    USE_IPEX: bool = os.getenv("USE_IPEX", "false").lower() == "true"
+    # Also store embedding tables as 8-bit (weight-only) during dynamic quantization
+    QUANTIZE_EMBEDDINGS: bool = os.getenv("QUANTIZE_EMBEDDINGS", "false").lower() == "true"
+    # Quantized kernel backend ("fbgemm", "x86", "onednn", ...); empty keeps torch's default
+    QUANTIZED_ENGINE: str = os.getenv("QUANTIZED_ENGINE", "")
     
     # RAG Settings
     EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
     TOP_K_RETRIEVAL: int = int(os.getenv("TOP_K_RETRIEVAL", "15"))
     CONVERSATION_HISTORY_LENGTH: int = int(os.getenv("CONVERSATION_HISTORY_LENGTH", "10"))
+    RESPONSE_CACHE_SIZE: int = int(os.getenv("RESPONSE_CACHE_SIZE", "10000"))
+    RESPONSE_CACHE_TTL: int = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+    RAG_MEMO_CACHE_SIZE: int = int(os.getenv("RAG_MEMO_CACHE_SIZE", "1024"))
+    RETRIEVAL_WORKERS: int = int(os.getenv("RETRIEVAL_WORKERS", "4"))
+    # Paraphrase cache for chat answers; opt-in because near-identical wording can ask a
+    # different legal question ("Can the licensor terminate..." vs "...licensee...")
+    SEMANTIC_CACHE_ENABLED: bool = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.93"))
+    SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "512"))
+    # Cross-encoder that reorders the merged retrieval candidates (opt-in; loaded at startup,
+    # e.g. "cross-encoder/ms-marco-MiniLM-L-6-v2"); empty disables reranking
+    RERANKER_MODEL: str = os.getenv("RERANKER_MODEL", "")
+    RERANK_CANDIDATES: int = int(os.getenv("RERANK_CANDIDATES", "20"))
+    RERANK_BATCH_SIZE: int = int(os.getenv("RERANK_BATCH_SIZE", "32"))
     
     # Database Paths
     CHROMA_DB_PATH: str = os.getenv("CHROMA_DB_PATH", "./data/chroma")
+    CHROMA_BATCH_SIZE: int = int(os.getenv("CHROMA_BATCH_SIZE", "166"))
+    CHROMA_COLLECTION_CACHE_SIZE: int = int(os.getenv("CHROMA_COLLECTION_CACHE_SIZE", "128"))
+    EMBEDDING_CACHE_SIZE: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
+    PERSISTENT_EMBEDDING_CACHE_SIZE: int = int(os.getenv("PERSISTENT_EMBEDDING_CACHE_SIZE", "50000"))
+    IN_MEMORY_VECTOR_SEARCH: bool = os.getenv("IN_MEMORY_VECTOR_SEARCH", "true").lower() == "true"
+    VECTOR_INDEX_CACHE_SIZE: int = int(os.getenv("VECTOR_INDEX_CACHE_SIZE", "32"))
+    VECTOR_INDEX_INT8: bool = os.getenv("VECTOR_INDEX_INT8", "false").lower() == "true"
     SQLITE_DB_PATH: str = os.getenv("SQLITE_DB_PATH", "./data/database.db")
+    SQLITE_READ_POOL_SIZE: int = int(os.getenv("SQLITE_READ_POOL_SIZE", "4"))
     UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "./data/uploads")
+    EXPORT_CACHE_DIR: str = os.getenv("EXPORT_CACHE_DIR", "./data/exports/cache")
     LOG_DIR: str = os.getenv("LOG_DIR", "./logs")
     
-    # CUAD Questions (41 clause types)
-    CUAD_QUESTIONS: list = [
+    # CUAD Questions (41 clause types); a tuple so the shared sequence can't be mutated
+    CUAD_QUESTIONS: tuple = (
         "Highlight the parts (if any) of this contract related to \"Document Name\".",
         "Highlight the parts (if any) of this contract related to \"Parties\".",
         "Highlight the parts (if any) of this contract related to \"Agreement Date\".",
@@ -88,13 +139,14 @@ class Settings:
         "Highlight the parts (if any) of this contract related to \"Covenant Not To Sue\".",
         "Highlight the parts (if any) of this contract related to \"Third Party Beneficiary\".",
         "Highlight the parts (if any) of this contract related to \"Indemnity\".",
-    ]
+    )
     
     @classmethod 
     def create_directories(cls):
         """Create necessary directories if they don't exist"""
         Path(cls.CHROMA_DB_PATH).mkdir(parents=True, exist_ok=True)
         Path(cls.UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
+        Path(cls.EXPORT_CACHE_DIR).mkdir(parents=True, exist_ok=True)
         Path(cls.LOG_DIR).mkdir(parents=True, exist_ok=True)
         Path(cls.SQLITE_DB_PATH).parent.mkdir(parents=True, exist_ok=True)
     
@@ -1,24 +1,128 @@
+import hashlib
+import queue
 import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
 from pathlib import Path
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Iterable, Tuple
 import chromadb
+import numpy as np
 from chromadb.config import Settings as ChromaSettings
+from chromadb.utils import embedding_functions
 from app.config import settings
 from app.core.logger import get_logger
+from app.core.vector_index import VectorIndex
 
 logger = get_logger(__name__)
 
+# Prefix hashed with every text in the persistent embedding cache, so vectors from a
+# different embedding model can never be served for the same text
+EMBEDDING_CACHE_NAMESPACE = b"chroma-default:all-MiniLM-L6-v2\x00"
+
+# Keeps each "IN (...)" lookup well under SQLite's bound-parameter limit
+EMBEDDING_LOOKUP_BATCH = 500
+
 class SQLiteDB:
     """SQLite database manager for conversation history"""
     
     def __init__(self, db_path: str = None):
         self.db_path = db_path or settings.SQLITE_DB_PATH
+        self._conn = None
+        self._lock = threading.RLock()
+        self._readers = queue.Queue(maxsize=settings.SQLITE_READ_POOL_SIZE)
         self._init_db()
-    
+
+    def _connect(self, read_only: bool = False) -> sqlite3.Connection:
+        """Open a connection and apply connection-level PRAGMAs"""
+        if read_only:
+            uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False, isolation_level=None)
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")  # Wait for other processes' writers instead of failing
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-20000")  # ~20MB page cache
+        conn.execute("PRAGMA mmap_size=268435456")  # 256MB memory-mapped reads
+        return conn
+
+    def _shared_connection(self) -> sqlite3.Connection:
+        """Return the long-lived shared connection, reconnecting if it has gone stale"""
+        if self._conn is not None:
+            try:
+                self._conn.execute("SELECT 1")
+                return self._conn
+            except sqlite3.Error as e:
+                logger.warning(f"Shared SQLite connection unusable, reconnecting: {str(e)}")
+                try:
+                    self._conn.close()
+                except sqlite3.Error:
+                    pass
+
+        self._conn = self._connect()
+        return self._conn
+
+    @contextmanager
+    def cursor(self):
+        """
+        Yield a cursor on the shared connection
+
+        Access is serialized with a lock, so all in-process writes are queued behind a
+        single writer rather than contending inside SQLite. Statements autocommit unless the caller
+        issues an explicit BEGIN, in which case the transaction is committed on
+        exit or rolled back on error.
+        """
+        with self._lock:
+            conn = self._shared_connection()
+            cur = conn.cursor()
+            try:
+                yield cur
+                if conn.in_transaction:
+                    conn.commit()
+            except Exception:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+            finally:
+                cur.close()
+
+    @contextmanager
+    def read_cursor(self):
+        """
+        Yield a cursor on a pooled read-only connection
+        
+        Readers don't take the write lock; WAL lets them run alongside the writer.
+        """
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = self._connect(read_only=True)
+        
+        cur = conn.cursor()
+        healthy = True
+        try:
+            yield cur
+        except sqlite3.Error:
+            healthy = False
+            raise
+        finally:
+            cur.close()
+            if healthy:
+                try:
+                    self._readers.put_nowait(conn)
+                except queue.Full:
+                    conn.close()
+            else:
+                conn.close()
+
     def _init_db(self):
         """Initialize database tables"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._shared_connection()
             cursor = conn.cursor()
             
             # Conversations table
@@ -62,39 +166,173 @@ class SQLiteDB:
                     page_number INTEGER,
                     char_start INTEGER,
                     char_end INTEGER,
+                    reliability_flag TEXT,
                     FOREIGN KEY (doc_id) REFERENCES documents(doc_id)
                 )
             ''')
             
-            conn.commit()
-            conn.close()
+            columns = {row[1] for row in cursor.execute("PRAGMA table_info(extracted_clauses)")}
+            if "reliability_flag" not in columns:
+                self._add_reliability_flags(cursor)
+            
+            # Embeddings by SHA-256 of (model namespace + text), shared by every collection
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    text_hash BLOB PRIMARY KEY,
+                    embedding BLOB NOT NULL
+                )
+            ''')
+            
+            # Per-document clause lookups (export, GROUP BY risk_level). Session lookups on
+            # conversations are already served by the UNIQUE(session_id, turn_number) index.
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_extracted_clauses_doc ON extracted_clauses(doc_id, risk_level)"
+            )
+            
+            cursor.close()
             logger.info("SQLite database initialized successfully")
         
         except Exception as e:
             logger.error(f"Failed to initialize SQLite database: {str(e)}")
             raise
     
+    @staticmethod
+    def _add_reliability_flags(cursor: sqlite3.Cursor):
+        """
+        Migrate a database created before reliability flags were stored: add the column
+        and recompute each flag from the stored clause text and confidence
+        """
+        from app.utils.risk_rules import RiskRules
+        
+        rows = cursor.execute(
+            "SELECT id, clause_type, extracted_text, confidence FROM extracted_clauses"
+        ).fetchall()
+        flags = [
+            (RiskRules.assess_clause_risk(clause_type, extracted_text, confidence or 0.0)[2], row_id)
+            for row_id, clause_type, extracted_text, confidence in rows
+        ]
+        
+        cursor.execute("BEGIN")
+        cursor.execute("ALTER TABLE extracted_clauses ADD COLUMN reliability_flag TEXT")
+        cursor.executemany("UPDATE extracted_clauses SET reliability_flag = ? WHERE id = ?", flags)
+        cursor.execute("COMMIT")
+        logger.info(f"Added reliability flags to {len(flags)} stored clauses")
+    
     def get_connection(self):
-        """Get database connection"""
-        return sqlite3.connect(self.db_path)
+        """Get a new, caller-owned database connection (prefer cursor() in request handlers)"""
+        return self._connect()
+
+    def insert_document(self, doc_id: str, filename: str, num_pages: int, status: str):
+        """Register a newly uploaded document"""
+        with self.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO documents (doc_id, filename, num_pages, status) VALUES (?, ?, ?, ?)",
+                (doc_id, filename, num_pages, status)
+            )
+
+    def update_document_status(self, doc_id: str, status: str):
+        """Set the processing status of a document"""
+        with self.cursor() as cursor:
+            cursor.execute(
+                "UPDATE documents SET status = ? WHERE doc_id = ?",
+                (status, doc_id)
+            )
+
+    def get_document_status(self, doc_id: str) -> Optional[str]:
+        """Return the processing status of a document, or None if it doesn't exist"""
+        with self.read_cursor() as cursor:
+            cursor.execute("SELECT status FROM documents WHERE doc_id = ?", (doc_id,))
+            row = cursor.fetchone()
+        
+        return row[0] if row else None
+
+    def reset_document_statuses(self, from_status: str, to_status: str) -> int:
+        """
+        Move every document in one status to another (e.g. work interrupted by a restart)
+        
+        Returns:
+            Number of documents updated
+        """
+        with self.cursor() as cursor:
+            cursor.execute(
+                "UPDATE documents SET status = ? WHERE status = ?",
+                (to_status, from_status)
+            )
+            return cursor.rowcount
+
+    def get_cached_embeddings(self, text_hashes: List[bytes]) -> Dict[bytes, bytes]:
+        """Look up stored float32 embedding blobs by text hash (missing hashes are omitted)"""
+        found = {}
+        with self.read_cursor() as cursor:
+            for start in range(0, len(text_hashes), EMBEDDING_LOOKUP_BATCH):
+                batch = text_hashes[start:start + EMBEDDING_LOOKUP_BATCH]
+                cursor.execute(
+                    f"SELECT text_hash, embedding FROM embedding_cache WHERE text_hash IN ({','.join('?' * len(batch))})",
+                    batch
+                )
+                found.update(cursor.fetchall())
+        return found
+
+    def save_cached_embeddings(self, items: List[Tuple[bytes, bytes]], max_rows: int):
+        """Store (text_hash, embedding blob) pairs, dropping the oldest rows beyond max_rows"""
+        with self.cursor() as cursor:
+            cursor.execute("BEGIN")
+            cursor.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (text_hash, embedding) VALUES (?, ?)",
+                items
+            )
+            cursor.execute(
+                "DELETE FROM embedding_cache WHERE rowid <= (SELECT MAX(rowid) FROM embedding_cache) - ?",
+                (max_rows,)
+            )
+
+    def delete_conversation(self, session_id: str) -> int:
+        """Delete all turns for a session and return the number of rows removed"""
+        with self.cursor() as cursor:
+            cursor.execute("DELETE FROM conversations WHERE session_id = ?", (session_id,))
+            return cursor.rowcount
     
     def save_conversation_turn(self, session_id: str, doc_id: str, turn_number: int,
                                user_query: str, ai_response: str, 
                                reformulated_query: str = None, confidence: float = None):
         """Save a conversation turn"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            with self.cursor() as cursor:
+                cursor.execute('''
+                    INSERT OR REPLACE INTO conversations 
+                    (session_id, doc_id, turn_number, user_query, reformulated_query, ai_response, confidence)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (session_id, doc_id, turn_number, user_query, reformulated_query, ai_response, confidence))
             
-            cursor.execute('''
-                INSERT OR REPLACE INTO conversations 
-                (session_id, doc_id, turn_number, user_query, reformulated_query, ai_response, confidence)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (session_id, doc_id, turn_number, user_query, reformulated_query, ai_response, confidence))
+            logger.debug(f"Saved conversation turn {turn_number} for session {session_id}")
+        
+        except Exception as e:
+            logger.error(f"Failed to save conversation turn: {str(e)}")
+            raise
+    
+    def append_conversation_turn(self, session_id: str, doc_id: str, user_query: str,
+                                 ai_response: str, reformulated_query: str = None,
+                                 confidence: float = None) -> int:
+        """
+        Append a turn to a session, assigning the next turn number in the same statement
+        
+        Returns:
+            Turn number assigned to the saved turn
+        """
+        try:
+            with self.cursor() as cursor:
+                cursor.execute('''
+                    INSERT INTO conversations 
+                    (session_id, doc_id, turn_number, user_query, reformulated_query, ai_response, confidence)
+                    SELECT ?, ?, COALESCE(MAX(turn_number), 0) + 1, ?, ?, ?, ?
+                    FROM conversations WHERE session_id = ?
+                ''', (session_id, doc_id, user_query, reformulated_query, ai_response, confidence, session_id))
+                
+                cursor.execute("SELECT turn_number FROM conversations WHERE id = ?", (cursor.lastrowid,))
+                turn_number = cursor.fetchone()[0]
             
-            conn.commit()
-            conn.close()
             logger.debug(f"Saved conversation turn {turn_number} for session {session_id}")
+            return turn_number
         
         except Exception as e:
             logger.error(f"Failed to save conversation turn: {str(e)}")
@@ -103,20 +341,17 @@ class SQLiteDB:
     def get_conversation_history(self, session_id: str, limit: int = None) -> List[Dict]:
         """Retrieve conversation history for a session"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            limit_clause = f"LIMIT {limit}" if limit else ""
-            cursor.execute(f'''
-                SELECT turn_number, user_query, reformulated_query, ai_response, timestamp
-                FROM conversations
-                WHERE session_id = ?
-                ORDER BY turn_number DESC
-                {limit_clause}
-            ''', (session_id,))
-            
-            rows = cursor.fetchall()
-            conn.close()
+            # LIMIT -1 is unbounded; binding keeps a single cached prepared statement
+            with self.read_cursor() as cursor:
+                cursor.execute('''
+                    SELECT turn_number, user_query, reformulated_query, ai_response, timestamp
+                    FROM conversations
+                    WHERE session_id = ?
+                    ORDER BY turn_number DESC
+                    LIMIT ?
+                ''', (session_id, int(limit) if limit else -1))
+                
+                rows = cursor.fetchall()
             
             history = [
                 {
@@ -139,52 +374,372 @@ class SQLiteDB:
 class ChromaDBManager:
     """ChromaDB manager for vector storage and retrieval"""
     
-    def __init__(self):
+    def __init__(self, embedding_store: Optional[SQLiteDB] = None):
         self.client = chromadb.PersistentClient(
             path=settings.CHROMA_DB_PATH,
             settings=ChromaSettings(anonymized_telemetry=False)
         )
+        self.batch_size = settings.CHROMA_BATCH_SIZE
+        # Same model Chroma uses by default, held explicitly so queries can be embedded once
+        self.embedding_function = embedding_functions.DefaultEmbeddingFunction()
+        # Persistent embeddings by text hash: re-uploads of a contract and repeat queries
+        # after a restart skip the model
+        self.embedding_store = embedding_store if settings.PERSISTENT_EMBEDDING_CACHE_SIZE > 0 else None
+        # Embeds the next sync batch while the current one is written
+        self._embed_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chroma-embed")
+        self.collection_cache_size = settings.CHROMA_COLLECTION_CACHE_SIZE
+        self._collections: "OrderedDict[str, object]" = OrderedDict()
+        self._collections_lock = threading.Lock()
+        # Query-side embeddings by text, so repeat questions skip the embedding model
+        self.embedding_cache_size = settings.EMBEDDING_CACHE_SIZE
+        self._embedding_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._embedding_cache_lock = threading.Lock()
+        # In-memory exact search over each collection's stored vectors (Chroma stays the
+        # persistent store); a generation counter discards loads that raced with a write
+        self.in_memory_search = settings.IN_MEMORY_VECTOR_SEARCH
+        self.vector_index_cache_size = settings.VECTOR_INDEX_CACHE_SIZE
+        self._vector_indexes: "OrderedDict[str, VectorIndex]" = OrderedDict()
+        self._vector_index_generations: Dict[str, int] = {}
+        self._vector_indexes_lock = threading.Lock()
         logger.info("ChromaDB client initialized")
     
-    def get_or_create_collection(self, collection_name: str):
-        """Get or create a ChromaDB collection"""
+    def _write_batch(self, write, documents: Optional[List[str]], metadatas: List[Dict],
+                     ids: List[str], embeddings: Optional[List[List[float]]] = None) -> Optional[Exception]:
+        """
+        Call a collection write method (add/upsert/update) for one batch
+        
+        Returns:
+            The error if the write failed (it is logged, not raised), otherwise None
+        """
+        kwargs = {"metadatas": metadatas, "ids": ids}
+        if documents is not None:
+            kwargs["documents"] = documents
+        if embeddings is not None:
+            kwargs["embeddings"] = embeddings
+        
         try:
-            collection = self.client.get_or_create_collection(
-                name=collection_name,
-                metadata={"description": "Contract text and extracted clauses"}
+            write(**kwargs)
+            return None
+        except Exception as e:
+            logger.error(f"ChromaDB batch write failed for {len(ids)} items ({ids[0]} .. {ids[-1]}): {str(e)}")
+            return e
+    
+    def _upsert_embedded(self, collection, embedding: Future,
+                         items: List[Tuple[str, Dict, str]]) -> Optional[Exception]:
+        """
+        Upsert (document, metadata, id) items whose embeddings were computed ahead
+        
+        Returns:
+            The error if embedding or the write failed (it is logged, not raised), otherwise None
+        """
+        documents, metadatas, ids = (list(column) for column in zip(*items))
+        
+        try:
+            embeddings = embedding.result()
+        except Exception as e:
+            logger.error(f"Embedding failed for {len(ids)} items ({ids[0]} .. {ids[-1]}): {str(e)}")
+            return e
+        
+        return self._write_batch(collection.upsert, documents, metadatas, ids, embeddings=embeddings)
+    
+    def _write_in_batches(self, write, documents: Optional[List[str]], metadatas: List[Dict], ids: List[str]) -> int:
+        """
+        Call a collection write method (add/upsert/update) over fixed-size slices
+        
+        Keeps each Chroma write (embedding call + SQLite transaction + HNSW update) bounded.
+        A failing batch is logged and skipped so one bad chunk doesn't lose the whole
+        document; the error is only raised if every batch fails.
+        
+        Returns:
+            Number of items in batches that failed
+        """
+        failed = 0
+        last_error = None
+        
+        for start in range(0, len(ids), self.batch_size):
+            end = start + self.batch_size
+            error = self._write_batch(
+                write,
+                documents[start:end] if documents is not None else None,
+                metadatas[start:end],
+                ids[start:end]
             )
-            logger.info(f"Collection '{collection_name}' ready")
+            if error is not None:
+                failed += len(ids[start:end])
+                last_error = error
+        
+        if ids and failed == len(ids):
+            raise last_error
+        
+        return failed
+    
+    def get_or_create_collection(self, collection_name: str):
+        """Get or create a ChromaDB collection (handles are LRU-cached per name)"""
+        try:
+            with self._collections_lock:
+                collection = self._collections.get(collection_name)
+                if collection is not None:
+                    self._collections.move_to_end(collection_name)
+                    return collection
+                
+                collection = self.client.get_or_create_collection(
+                    name=collection_name,
+                    metadata={"description": "Contract text and extracted clauses"},
+                    embedding_function=self.embedding_function
+                )
+                self._collections[collection_name] = collection
+                while len(self._collections) > self.collection_cache_size:
+                    self._collections.popitem(last=False)
+                logger.info(f"Collection '{collection_name}' ready")
             return collection
         
         except Exception as e:
             logger.error(f"Failed to create/get collection: {str(e)}")
             raise
     
+    def _get_vector_index(self, collection_name: str) -> VectorIndex:
+        """Return the in-memory index for a collection, loading its stored vectors on first use"""
+        with self._vector_indexes_lock:
+            index = self._vector_indexes.get(collection_name)
+            if index is not None:
+                self._vector_indexes.move_to_end(collection_name)
+                return index
+            generation = self._vector_index_generations.get(collection_name, 0)
+        
+        collection = self.get_or_create_collection(collection_name)
+        stored = collection.get(include=["embeddings", "documents", "metadatas"])
+        index = VectorIndex(
+            stored["ids"],
+            stored["embeddings"],
+            stored["documents"],
+            stored["metadatas"],
+            quantize=settings.VECTOR_INDEX_INT8
+        )
+        
+        with self._vector_indexes_lock:
+            if self._vector_index_generations.get(collection_name, 0) == generation:
+                self._vector_indexes[collection_name] = index
+                while len(self._vector_indexes) > self.vector_index_cache_size:
+                    self._vector_indexes.popitem(last=False)
+        
+        logger.debug(f"Loaded {len(index)} vectors from '{collection_name}' into memory")
+        return index
+    
+    def _invalidate_vector_index(self, collection_name: str):
+        """Drop a collection's in-memory index after its contents change"""
+        with self._vector_indexes_lock:
+            self._vector_indexes.pop(collection_name, None)
+            self._vector_index_generations[collection_name] = self._vector_index_generations.get(collection_name, 0) + 1
+    
+    def drop_collection(self, collection_name: str):
+        """Delete a collection and forget its cached handle"""
+        with self._collections_lock:
+            self._collections.pop(collection_name, None)
+        self._invalidate_vector_index(collection_name)
+        
+        try:
+            self.client.delete_collection(name=collection_name)
+            logger.info(f"Collection '{collection_name}' deleted")
+        
+        except Exception as e:
+            logger.error(f"Failed to delete collection: {str(e)}")
+            raise
+    
     def add_documents(self, collection_name: str, documents: List[str], 
                      metadatas: List[Dict], ids: List[str]):
         """Add documents to collection"""
         try:
             collection = self.get_or_create_collection(collection_name)
-            collection.add(
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
-            )
-            logger.info(f"Added {len(documents)} documents to collection '{collection_name}'")
+            failed = self._write_in_batches(collection.add, documents, metadatas, ids)
+            logger.info(f"Added {len(documents) - failed} documents to collection '{collection_name}'"
+                        + (f" ({failed} failed)" if failed else ""))
         
         except Exception as e:
             logger.error(f"Failed to add documents to ChromaDB: {str(e)}")
             raise
+        
+        finally:
+            self._invalidate_vector_index(collection_name)
+    
+    def sync_documents(self, collection_name: str, items: Iterable[Tuple[str, Dict, str]]) -> Dict[str, int]:
+        """
+        Make a collection hold exactly the given documents, embedding only what changed
+        
+        Items are consumed lazily in batches of batch_size, so only a couple of batches
+        of the payload are held at a time. Items whose stored text is unchanged keep
+        their existing embeddings (metadata is updated in place if it differs), new or
+        changed texts are upserted, and ids that are no longer present are deleted.
+        Each batch is embedded in the background while the previous one is written.
+        A failing batch is logged and skipped; the error is only raised if every write
+        fails.
+        
+        Args:
+            collection_name: Collection to sync
+            items: Iterable of (document, metadata, id) tuples
+        
+        Returns:
+            Counts of embedded, metadata-only updated, unchanged, deleted and failed items
+        """
+        try:
+            collection = self.get_or_create_collection(collection_name)
+            existing = collection.get(include=["documents", "metadatas"])
+            stored = {
+                item_id: (document, metadata)
+                for item_id, document, metadata in zip(
+                    existing["ids"], existing["documents"], existing["metadatas"]
+                )
+            }
+            
+            counts = {"embedded": 0, "metadata_updated": 0, "unchanged": 0, "deleted": 0, "failed": 0}
+            seen_ids = set()
+            last_error = None
+            pending_upsert = None  # (embedding future, items) of the previous batch
+            items = iter(items)
+            
+            while True:
+                batch = list(islice(items, self.batch_size))
+                
+                to_embed = []
+                to_update = []
+                for item in batch:
+                    document, metadata, item_id = item
+                    seen_ids.add(item_id)
+                    if item_id not in stored or stored[item_id][0] != document:
+                        to_embed.append(item)
+                    elif stored[item_id][1] != metadata:
+                        to_update.append(item)
+                    else:
+                        counts["unchanged"] += 1
+                
+                writes = []
+                if to_update:
+                    _, metadatas, ids = (list(column) for column in zip(*to_update))
+                    writes.append(("metadata_updated", to_update, self._write_batch(collection.update, None, metadatas, ids)))
+                
+                # Start embedding this batch, then write the previous one while it runs
+                embedding = self._embed_executor.submit(self.embed, [item[0] for item in to_embed]) if to_embed else None
+                if pending_upsert is not None:
+                    writes.append(("embedded", pending_upsert[1], self._upsert_embedded(collection, *pending_upsert)))
+                pending_upsert = (embedding, to_embed) if to_embed else None
+                
+                for count_key, written_items, error in writes:
+                    counts[count_key] += len(written_items)
+                    if error is not None:
+                        counts["failed"] += len(written_items)
+                        last_error = error
+                
+                if not batch:
+                    break
+            
+            stale_ids = list(stored.keys() - seen_ids)
+            if stale_ids:
+                collection.delete(ids=stale_ids)
+            counts["deleted"] = len(stale_ids)
+            
+            written = counts["embedded"] + counts["metadata_updated"]
+            if written and counts["failed"] == written:
+                raise last_error
+            
+            logger.info(f"Synced collection '{collection_name}': {counts}")
+            return counts
+        
+        except Exception as e:
+            logger.error(f"Failed to sync documents to ChromaDB: {str(e)}")
+            raise
+        
+        finally:
+            self._invalidate_vector_index(collection_name)
+    
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts with the collections' embedding function, reusing persisted embeddings"""
+        if self.embedding_store is None or not texts:
+            return [list(map(float, embedding)) for embedding in self.embedding_function(texts)]
+        
+        keys = [hashlib.sha256(EMBEDDING_CACHE_NAMESPACE + text.encode("utf-8")).digest() for text in texts]
+        try:
+            stored = self.embedding_store.get_cached_embeddings(list(set(keys)))
+        except Exception as e:
+            logger.warning(f"Embedding cache lookup failed: {str(e)}")
+            stored = {}
+        
+        embeddings = [
+            np.frombuffer(stored[key], dtype=np.float32).tolist() if key in stored else None
+            for key in keys
+        ]
+        # Embed each distinct missing text once (boilerplate chunks repeat within a contract)
+        misses: Dict[bytes, int] = {}
+        for i, embedding in enumerate(embeddings):
+            if embedding is None:
+                misses.setdefault(keys[i], i)
+        
+        if misses:
+            computed = dict(zip(misses, (
+                np.asarray(embedding, dtype=np.float32)
+                for embedding in self.embedding_function([texts[i] for i in misses.values()])
+            )))
+            for i, key in enumerate(keys):
+                if embeddings[i] is None:
+                    embeddings[i] = computed[key].tolist()
+            
+            try:
+                self.embedding_store.save_cached_embeddings(
+                    [(key, embedding.tobytes()) for key, embedding in computed.items()],
+                    max_rows=settings.PERSISTENT_EMBEDDING_CACHE_SIZE
+                )
+            except Exception as e:
+                logger.warning(f"Embedding cache write failed: {str(e)}")
+        
+        return embeddings
+    
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed query texts, reusing LRU-cached embeddings and embedding all misses in one call
+        
+        Returns:
+            One embedding per text, in order
+        """
+        with self._embedding_cache_lock:
+            cached = {text: self._embedding_cache.get(text) for text in texts}
+            for text, embedding in cached.items():
+                if embedding is not None:
+                    self._embedding_cache.move_to_end(text)
+        
+        misses = [text for text, embedding in cached.items() if embedding is None]
+        if misses:
+            embedded = self.embed(misses)
+            cached.update(zip(misses, embedded))
+            
+            with self._embedding_cache_lock:
+                for text, embedding in zip(misses, embedded):
+                    self._embedding_cache[text] = embedding
+                    self._embedding_cache.move_to_end(text)
+                while len(self._embedding_cache) > self.embedding_cache_size:
+                    self._embedding_cache.popitem(last=False)
+        
+        return [cached[text] for text in texts]
     
     def query_documents(self, collection_name: str, query_texts: List[str], 
-                       n_results: int = 5, where: Dict = None) -> Dict:
-        """Query documents from collection"""
+                       n_results: int = 5, where: Dict = None,
+                       query_embeddings: Optional[List[List[float]]] = None) -> Dict:
+        """Query documents from collection (precomputed query_embeddings take precedence)"""
+        if self.in_memory_search and query_embeddings is not None:
+            try:
+                results = self._get_vector_index(collection_name).query(query_embeddings, n_results, where)
+                logger.debug(f"Retrieved {len(results['documents'][0])} results from '{collection_name}' (in memory)")
+                return results
+            except Exception as e:
+                logger.warning(f"In-memory search failed for '{collection_name}', querying ChromaDB: {str(e)}")
+        
         try:
             collection = self.get_or_create_collection(collection_name)
+            if query_embeddings is not None:
+                query = {"query_embeddings": query_embeddings}
+            else:
+                query = {"query_texts": query_texts}
             results = collection.query(
-                query_texts=query_texts,
                 n_results=n_results,
-                where=where
+                where=where,
+                **query
             )
             logger.debug(f"Retrieved {len(results['documents'][0])} results from '{collection_name}'")
             return results
@@ -192,8 +747,26 @@ class ChromaDBManager:
         except Exception as e:
             logger.error(f"Failed to query ChromaDB: {str(e)}")
             raise
+    
+    def get_documents(self, collection_name: str, where: Dict = None) -> Dict:
+        """Fetch documents by metadata filter, without a similarity search"""
+        if self.in_memory_search:
+            try:
+                return self._get_vector_index(collection_name).get(where)
+            except Exception as e:
+                logger.warning(f"In-memory lookup failed for '{collection_name}', querying ChromaDB: {str(e)}")
+        
+        try:
+            collection = self.get_or_create_collection(collection_name)
+            results = collection.get(where=where, include=["documents", "metadatas"])
+            logger.debug(f"Fetched {len(results['documents'])} documents from '{collection_name}'")
+            return results
+        
+        except Exception as e:
+            logger.error(f"Failed to get documents from ChromaDB: {str(e)}")
+            raise
 
 
 # Singleton instances
 sqlite_db = SQLiteDB()
-chroma_db = ChromaDBManager()
+chroma_db = ChromaDBManager(embedding_store=sqlite_db)
@@ -1,13 +1,76 @@
+import atexit
 import logging
+import queue
 import sys
+import threading
 from pathlib import Path
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from datetime import datetime
+from typing import Dict
 from app.config import settings
 
 class LoggerSetup:
     """Professional logging configuration with file and console handlers"""
     
+    # One queue-backed writer per log file, shared by every logger
+    _queue_handlers: Dict[str, QueueHandler] = {}
+    _listeners: Dict[str, QueueListener] = {}
+    _lock = threading.Lock()
+    
+    @staticmethod
+    def _detailed_formatter() -> logging.Formatter:
+        return logging.Formatter(
+            fmt='%(asctime)s - %(name)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
+    
+    @classmethod
+    def _get_queue_handler(cls, log_file: str) -> QueueHandler:
+        """
+        Return the shared QueueHandler for a log file, starting its listener on first use
+        
+        Records are only enqueued by the calling thread; a background QueueListener
+        does the formatting and disk I/O for the rotating file and error handlers.
+        """
+        with cls._lock:
+            if log_file in cls._queue_handlers:
+                return cls._queue_handlers[log_file]
+            
+            detailed_formatter = cls._detailed_formatter()
+            
+            # File Handler (Rotating)
+            log_path = Path(settings.LOG_DIR) / log_file
+            file_handler = RotatingFileHandler(
+                log_path,
+                maxBytes=10*1024*1024,  # 10MB
+                backupCount=5,
+                encoding='utf-8'
+            )
+            file_handler.setLevel(logging.DEBUG)
+            file_handler.setFormatter(detailed_formatter)
+            
+            # Error File Handler (Separate file for errors)
+            error_log_path = Path(settings.LOG_DIR) / f"errors_{datetime.now().strftime('%Y%m%d')}.log"
+            error_handler = RotatingFileHandler(
+                error_log_path,
+                maxBytes=10*1024*1024,  # 10MB
+                backupCount=5,
+                encoding='utf-8'
+            )
+            error_handler.setLevel(logging.ERROR)
+            error_handler.setFormatter(detailed_formatter)
+            
+            log_queue = queue.Queue(-1)
+            listener = QueueListener(log_queue, file_handler, error_handler, respect_handler_level=True)
+            listener.start()
+            atexit.register(listener.stop)  # Flush queued records on shutdown
+            
+            queue_handler = QueueHandler(log_queue)
+            queue_handler.setLevel(logging.DEBUG)
+            cls._queue_handlers[log_file] = queue_handler
+            cls._listeners[log_file] = listener
+            return queue_handler
+    
     @staticmethod
     def setup_logger(name: str, log_file: str = None, level: str = None) -> logging.Logger:
         """
@@ -32,11 +95,6 @@ class LoggerSetup:
             return logger
         
         # Create formatters
-        detailed_formatter = logging.Formatter(
-            fmt='%(asctime)s - %(name)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
-        
         simple_formatter = logging.Formatter(
             fmt='%(asctime)s - %(levelname)s - %(message)s',
             datefmt='%H:%M:%S'
@@ -48,32 +106,11 @@ class LoggerSetup:
         console_handler.setFormatter(simple_formatter)
         logger.addHandler(console_handler)
         
-        # File Handler (Rotating)
+        # File + error handlers, written off-thread through a shared queue
         if log_file is None:
             log_file = f"app_{datetime.now().strftime('%Y%m%d')}.log"
         
-        log_path = Path(settings.LOG_DIR) / log_file
-        file_handler = RotatingFileHandler(
-            log_path,
-            maxBytes=10*1024*1024,  # 10MB
-            backupCount=5,
-            encoding='utf-8'
-        )
-        file_handler.setLevel(logging.DEBUG)
-        file_handler.setFormatter(detailed_formatter)
-        logger.addHandler(file_handler)
-        
-        # Error File Handler (Separate file for errors)
-        error_log_path = Path(settings.LOG_DIR) / f"errors_{datetime.now().strftime('%Y%m%d')}.log"
-        error_handler = RotatingFileHandler(
-            error_log_path,
-            maxBytes=10*1024*1024,  # 10MB
-            backupCount=5,
-            encoding='utf-8'
-        )
-        error_handler.setLevel(logging.ERROR)
-        error_handler.setFormatter(detailed_formatter)
-        logger.addHandler(error_handler)
+        logger.addHandler(LoggerSetup._get_queue_handler(log_file))
         
         return logger
 
@@ -0,0 +1,145 @@
+import sys
+from typing import Dict, List, Optional
+import numpy as np
+
+
+def _intern_metadata(metadata: Optional[Dict]) -> Dict:
+    """Copy a metadata dict with its keys and string values interned"""
+    return {
+        sys.intern(key): sys.intern(value) if isinstance(value, str) else value
+        for key, value in (metadata or {}).items()
+    }
+
+
+def matches_where(metadata: Dict, where: Optional[Dict]) -> bool:
+    """
+    Evaluate a ChromaDB metadata filter against one item's metadata
+
+    Supports $and/$or with the $eq and $in operators (plus the {field: value}
+    shorthand for $eq); a missing field never matches, as in Chroma.
+
+    Raises:
+        ValueError: For operators this evaluator doesn't implement
+    """
+    if not where:
+        return True
+
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            for operator, operand in condition.items():
+                if operator == "$eq":
+                    matched = key in metadata and metadata[key] == operand
+                elif operator == "$in":
+                    matched = key in metadata and metadata[key] in operand
+                else:
+                    raise ValueError(f"Unsupported where operator: {operator}")
+                if not matched:
+                    return False
+        elif key not in metadata or metadata[key] != condition:
+            return False
+
+    return True
+
+
+class VectorIndex:
+    """
+    In-memory exact nearest-neighbour index over one collection's stored embeddings
+    Per-contract collections hold a few hundred vectors, so a brute-force squared-L2
+    scan (Chroma's default distance) is sub-millisecond and skips the HNSW/SQLite
+    round-trip of a Chroma query
+
+    With quantize=True vectors are kept as int8 with a per-vector scale (4x less memory);
+    distances become approximate, norms are taken from the original float32 vectors
+    """
+
+    def __init__(self, ids: List[str], embeddings, documents: List[str], metadatas: List[Dict],
+                 quantize: bool = False):
+        self.ids = list(ids)
+        self.documents = list(documents)
+        # Metadata values are low-cardinality labels (type, doc_id, clause_type, risk_level)
+        # repeated on every item, so cached indexes share one string per distinct value
+        self.metadatas = [_intern_metadata(metadata) for metadata in metadatas]
+        if self.ids:
+            vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(self.ids), -1)
+        else:
+            vectors = np.empty((0, 0), dtype=np.float32)
+        self.squared_norms = np.einsum("ij,ij->i", vectors, vectors)
+
+        if quantize:
+            # Symmetric per-vector scaling: x ~= codes * scale, codes in [-127, 127]
+            max_abs = np.abs(vectors).max(axis=1) if len(vectors) else np.empty(0, dtype=np.float32)
+            self.scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+            self.embeddings = np.rint(vectors / self.scales[:, None]).astype(np.int8)
+        else:
+            self.scales = None
+            self.embeddings = vectors
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _filter(self, where: Optional[Dict]) -> np.ndarray:
+        """Indexes of items matching a metadata filter"""
+        if not where:
+            return np.arange(len(self.ids))
+        return np.fromiter(
+            (i for i, metadata in enumerate(self.metadatas) if matches_where(metadata, where)),
+            dtype=np.intp
+        )
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 5,
+              where: Optional[Dict] = None) -> Dict:
+        """
+        Nearest items to each query embedding, shaped like a Chroma query result
+
+        Returns:
+            Dictionary with ids, documents, metadatas and distances (one list per query)
+        """
+        candidates = self._filter(where)
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+
+        # Scan the stored arrays in place when every item qualifies; fancy indexing
+        # would copy the whole matrix on each query
+        if len(candidates) == len(self.ids):
+            embeddings, squared_norms, scales = self.embeddings, self.squared_norms, self.scales
+        else:
+            embeddings = self.embeddings[candidates]
+            squared_norms = self.squared_norms[candidates]
+            scales = None if self.scales is None else self.scales[candidates]
+
+        for query in queries:
+            if len(candidates):
+                dots = embeddings @ query
+                if scales is not None:
+                    dots = dots * scales
+                distances = squared_norms - 2.0 * dots + float(query @ query)
+                k = min(n_results, len(candidates))
+                nearest = np.argpartition(distances, k - 1)[:k] if k < len(candidates) else np.arange(len(candidates))
+                nearest = nearest[np.argsort(distances[nearest], kind="stable")]
+                hits = candidates[nearest]
+                hit_distances = distances[nearest].tolist()
+            else:
+                hits = []
+                hit_distances = []
+
+            results["ids"].append([self.ids[i] for i in hits])
+            results["documents"].append([self.documents[i] for i in hits])
+            results["metadatas"].append([self.metadatas[i] for i in hits])
+            results["distances"].append(hit_distances)
+
+        return results
+
+    def get(self, where: Optional[Dict] = None) -> Dict:
+        """Items matching a metadata filter, shaped like a Chroma get result"""
+        matches = self._filter(where)
+        return {
+            "ids": [self.ids[i] for i in matches],
+            "documents": [self.documents[i] for i in matches],
+            "metadatas": [self.metadatas[i] for i in matches]
+        }
@@ -3,12 +3,14 @@ os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import JSONResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 from pathlib import Path
 from app.config import settings
 from app.api.routes import api_router
+from app.core.database import sqlite_db
 from app.core.logger import get_logger
 
 logger = get_logger(__name__)
@@ -28,6 +30,12 @@ async def lifespan(app: FastAPI):
     
     logger.info(f"Model path: {settings.MODEL_PATH}")
     logger.info(f"Device: {settings.DEVICE}")
+    
+    # A background index task doesn't survive a restart; let the next extract request requeue it
+    interrupted = sqlite_db.reset_document_statuses("indexing", "index_failed")
+    if interrupted:
+        logger.warning(f"Marked {interrupted} interrupted indexing job(s) as 'index_failed'")
+    
     logger.info("Application started successfully")
     
     yield
@@ -42,10 +50,13 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# Configure CORS
+# Compress large JSON payloads (extraction results carry 41 clauses)
+app.add_middleware(GZipMiddleware, minimum_size=settings.GZIP_MIN_SIZE)
+
+# Configure CORS (the bundled frontend is same-origin; restrict via CORS_ALLOWED_ORIGINS)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=settings.CORS_ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
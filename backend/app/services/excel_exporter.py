@@ -1,11 +1,31 @@
-import pandas as pd
+import glob
+import os
+import uuid
 from pathlib import Path
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Iterable, Sequence
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from app.config import settings
 from app.core.logger import get_logger
 
 logger = get_logger(__name__)
 
+HEADER_FONT = Font(bold=True)
+
+# Sheet header rows (data rows are generated as tuples in the same column order)
+OVERVIEW_COLUMNS = ("Field", "Value")
+ALL_CLAUSES_COLUMNS = (
+    "Clause Type", "Found", "Extracted Text", "Confidence",
+    "Risk Score", "Risk Level", "Page Number", "Reliability Flag"
+)
+HIGH_RISK_COLUMNS = (
+    "Clause Type", "Extracted Text", "Risk Score",
+    "Confidence", "Page Number", "Action Required"
+)
+MISSING_CLAUSES_COLUMNS = ("Clause Type", "Status", "Risk Score", "Importance", "Recommendation")
+
 class ExcelExporter:
     """
     Excel export service for contract analysis results
@@ -36,19 +56,22 @@ class ExcelExporter:
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 output_path = output_dir / f"{doc_id}_{timestamp}.xlsx"
             
-            # Create Excel writer
-            with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-                # Sheet 1: Overview
-                self._write_overview_sheet(writer, doc_id, filename, extraction_result)
-                
-                # Sheet 2: All Clauses
-                self._write_all_clauses_sheet(writer, extraction_result)
-                
-                # Sheet 3: High-Risk Clauses Only
-                self._write_high_risk_sheet(writer, extraction_result)
-                
-                # Sheet 4: Missing Critical Clauses
-                self._write_missing_clauses_sheet(writer, extraction_result)
+            # Write-only workbook streams rows to disk instead of holding every cell in memory
+            workbook = Workbook(write_only=True)
+            
+            # Sheet 1: Overview
+            self._write_overview_sheet(workbook, doc_id, filename, extraction_result)
+            
+            # Sheet 2: All Clauses
+            self._write_all_clauses_sheet(workbook, extraction_result)
+            
+            # Sheet 3: High-Risk Clauses Only
+            self._write_high_risk_sheet(workbook, extraction_result)
+            
+            # Sheet 4: Missing Critical Clauses
+            self._write_missing_clauses_sheet(workbook, extraction_result)
+            
+            workbook.save(output_path)
             
             logger.info(f"Excel file exported successfully: {output_path}")
             
@@ -58,98 +81,148 @@ class ExcelExporter:
             logger.error(f"Failed to export to Excel: {str(e)}", exc_info=True)
             raise
     
-    def _write_overview_sheet(self, writer, doc_id: str, filename: str, result: Dict):
+    @staticmethod
+    def cache_path(doc_id: str, version: int) -> Path:
+        """
+        Location of the cached export workbook for one extraction of a document
+        
+        Keying on the extraction version means a workbook built from an older
+        extraction can never be served for a newer one, even if it lands late.
+        """
+        return Path(settings.EXPORT_CACHE_DIR) / f"{doc_id}_{version}.xlsx"
+    
+    @staticmethod
+    def invalidate_cache(doc_id: str):
+        """Remove every cached export for a document (frees disk after re-extraction)"""
+        pattern = str(Path(settings.EXPORT_CACHE_DIR) / f"{glob.escape(doc_id)}_*.xlsx")
+        for path in glob.glob(pattern):
+            try:
+                os.unlink(path)
+            except OSError as e:
+                logger.warning(f"Failed to invalidate export cache for {doc_id}: {str(e)}")
+    
+    def export_cached(self, doc_id: str, version: int, filename: str, extraction_result: Dict) -> str:
+        """
+        Export results into the cache location for their extraction version
+        
+        The workbook is written to a temporary file and atomically moved into
+        place so concurrent readers never see a partially written file.
+        
+        Returns:
+            Path to the cached Excel file
+        """
+        cache_path = self.cache_path(doc_id, version)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_name(f"{doc_id}_{version}.{uuid.uuid4().hex}.tmp")
+        
+        try:
+            self.export_results(doc_id, filename, extraction_result, output_path=str(tmp_path))
+            os.replace(tmp_path, cache_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        
+        return str(cache_path)
+    
+    def _append_sheet(self, workbook: Workbook, title: str, columns: Sequence[str], rows: Iterable[Sequence]) -> int:
+        """
+        Append a sheet with a bold header row followed by data rows
+        
+        Returns:
+            Number of data rows written
+        """
+        worksheet = workbook.create_sheet(title=title)
+        
+        header = []
+        for column in columns:
+            cell = WriteOnlyCell(worksheet, value=column)
+            cell.font = HEADER_FONT
+            header.append(cell)
+        worksheet.append(header)
+        
+        count = 0
+        for row in rows:
+            worksheet.append(row)
+            count += 1
+        
+        return count
+    
+    def _write_overview_sheet(self, workbook, doc_id: str, filename: str, result: Dict):
         """Write overview summary sheet"""
-        overview_data = {
-            "Field": [
-                "Document ID",
-                "Filename",
-                "Analysis Date",
-                "Number of Pages",
-                "Overall Risk Score",
-                "Risk Level",
-                "High-Risk Clauses",
-                "Medium-Risk Clauses",
-                "Low-Risk Clauses",
-                "Missing Critical Clauses",
-                "Total Clauses Analyzed"
-            ],
-            "Value": [
-                doc_id,
-                filename,
-                result["timestamp"].strftime("%Y-%m-%d %H:%M:%S"),
-                result["num_pages"],
-                f"{result['overall_risk_score']}/100",
-                result["risk_level"],
-                result["high_risk_count"],
-                result["medium_risk_count"],
-                result["low_risk_count"],
-                result["missing_critical_count"],
-                len(result["clauses"])
-            ]
-        }
-        
-        df_overview = pd.DataFrame(overview_data)
-        df_overview.to_excel(writer, sheet_name="Overview", index=False)
+        overview_rows = [
+            ("Document ID", doc_id),
+            ("Filename", filename),
+            ("Analysis Date", result["timestamp"].strftime("%Y-%m-%d %H:%M:%S")),
+            ("Number of Pages", result["num_pages"]),
+            ("Overall Risk Score", f"{result['overall_risk_score']}/100"),
+            ("Risk Level", result["risk_level"]),
+            ("High-Risk Clauses", result["high_risk_count"]),
+            ("Medium-Risk Clauses", result["medium_risk_count"]),
+            ("Low-Risk Clauses", result["low_risk_count"]),
+            ("Missing Critical Clauses", result["missing_critical_count"]),
+            ("Total Clauses Analyzed", len(result["clauses"]))
+        ]
+        
+        self._append_sheet(workbook, "Overview", OVERVIEW_COLUMNS, overview_rows)
         
         logger.debug("Overview sheet written")
     
-    def _write_all_clauses_sheet(self, writer, result: Dict):
+    def _write_all_clauses_sheet(self, workbook, result: Dict):
         """Write all clauses sheet"""
-        clauses_data = []
-        
-        for clause in result["clauses"]:
-            clauses_data.append({
-                "Clause Type": clause["clause_type"],
-                "Found": "Yes" if clause["found"] else "No",
-                "Extracted Text": clause["extracted_text"] if clause["extracted_text"] else "Not Found",
-                "Confidence": f"{clause['confidence']*100:.1f}%" if clause["found"] else "N/A",
-                "Risk Score": f"{clause['risk_score']}/100",
-                "Risk Level": clause["risk_level"],
-                "Page Number": clause["page_number"] if clause["page_number"] else "N/A",
-                "Reliability Flag": clause["reliability_flag"] if clause["reliability_flag"] else "OK"
-            })
-        
-        df_clauses = pd.DataFrame(clauses_data)
-        df_clauses.to_excel(writer, sheet_name="All Clauses", index=False)
-        
-        logger.debug(f"All clauses sheet written with {len(clauses_data)} rows")
+        rows = (
+            (
+                clause["clause_type"],
+                "Yes" if clause["found"] else "No",
+                clause["extracted_text"] if clause["extracted_text"] else "Not Found",
+                f"{clause['confidence']*100:.1f}%" if clause["found"] else "N/A",
+                f"{clause['risk_score']}/100",
+                clause["risk_level"],
+                clause["page_number"] if clause["page_number"] else "N/A",
+                clause["reliability_flag"] if clause["reliability_flag"] else "OK"
+            )
+            for clause in result["clauses"]
+        )
+        
+        count = self._append_sheet(workbook, "All Clauses", ALL_CLAUSES_COLUMNS, rows)
+        
+        logger.debug(f"All clauses sheet written with {count} rows")
     
-    def _write_high_risk_sheet(self, writer, result: Dict):
+    def _write_high_risk_sheet(self, workbook, result: Dict):
         """Write high-risk clauses only"""
-        high_risk_data = []
-        
-        for clause in result["clauses"]:
-            if clause["risk_level"] == "HIGH":
-                high_risk_data.append({
-                    "Clause Type": clause["clause_type"],
-                    "Extracted Text": clause["extracted_text"] if clause["extracted_text"] else "MISSING",
-                    "Risk Score": f"{clause['risk_score']}/100",
-                    "Confidence": f"{clause['confidence']*100:.1f}%" if clause["found"] else "N/A",
-                    "Page Number": clause["page_number"] if clause["page_number"] else "N/A",
-                    "Action Required": "REVIEW IMMEDIATELY" if clause["reliability_flag"] else "Review with legal counsel"
-                })
-        
-        df_high_risk = pd.DataFrame(high_risk_data)
-        df_high_risk.to_excel(writer, sheet_name="High-Risk Clauses", index=False)
-        
-        logger.debug(f"High-risk sheet written with {len(high_risk_data)} clauses")
+        rows = (
+            (
+                clause["clause_type"],
+                clause["extracted_text"] if clause["extracted_text"] else "MISSING",
+                f"{clause['risk_score']}/100",
+                f"{clause['confidence']*100:.1f}%" if clause["found"] else "N/A",
+                clause["page_number"] if clause["page_number"] else "N/A",
+                "REVIEW IMMEDIATELY" if clause["reliability_flag"] else "Review with legal counsel"
+            )
+            for clause in result["clauses"]
+            if clause["risk_level"] == "HIGH"
+        )
+        
+        count = self._append_sheet(workbook, "High-Risk Clauses", HIGH_RISK_COLUMNS, rows)
+        
+        logger.debug(f"High-risk sheet written with {count} clauses")
     
-    def _write_missing_clauses_sheet(self, writer, result: Dict):
+    def _write_missing_clauses_sheet(self, workbook, result: Dict):
         """Write missing critical clauses"""
-        missing_data = []
-        
-        for clause in result["clauses"]:
-            if not clause["found"] and clause.get("reliability_flag") == "MISSING_CRITICAL":
-                missing_data.append({
-                    "Clause Type": clause["clause_type"],
-                    "Status": "MISSING",
-                    "Risk Score": f"{clause['risk_score']}/100",
-                    "Importance": "CRITICAL",
-                    "Recommendation": f"Add {clause['clause_type']} clause before signing"
-                })
-        
-        df_missing = pd.DataFrame(missing_data)
-        df_missing.to_excel(writer, sheet_name="Missing Critical", index=False)
-        
-        logger.debug(f"Missing clauses sheet written with {len(missing_data)} items")
+        rows = (
+            (
+                clause["clause_type"],
+                "MISSING",
+                f"{clause['risk_score']}/100",
+                "CRITICAL",
+                f"Add {clause['clause_type']} clause before signing"
+            )
+            for clause in result["clauses"]
+            if not clause["found"] and clause.get("reliability_flag") == "MISSING_CRITICAL"
+        )
+        
+        count = self._append_sheet(workbook, "Missing Critical", MISSING_CLAUSES_COLUMNS, rows)
+        
+        logger.debug(f"Missing clauses sheet written with {count} items")
+
+
+# Singleton instance
+excel_exporter = ExcelExporter()
@@ -0,0 +1,34 @@
+"""
+Worker-process entry points for sharding clause extraction across CPU cores
+
+Kept separate from clause_extractor so that a spawned worker can adjust its
+settings before the ClauseExtractor singleton (and its model) is imported.
+"""
+from typing import Dict, List, Optional
+from app.config import settings
+from app.utils.text_processing import PageMap
+
+
+def init_worker(num_threads: int):
+    """
+    Process pool initializer: load one model per worker with its share of the cores
+
+    Args:
+        num_threads: Intra-op threads for this worker
+    """
+    settings.INFERENCE_THREADS = num_threads
+    settings.EXTRACTION_PROCESSES = 0  # Workers run their shard in-process
+
+    from app.services.clause_extractor import clause_extractor  # noqa: F401 - loads the model
+
+
+def process_questions(questions: List[str], context: str, char_to_page_map: Optional[PageMap] = None) -> List[List[Dict]]:
+    """
+    Answer a shard of the CUAD questions inside a worker process
+
+    Returns:
+        List of answer lists (one per question, in shard order)
+    """
+    from app.services.clause_extractor import clause_extractor
+
+    return clause_extractor._batch_process_all_questions(questions, context, char_to_page_map)
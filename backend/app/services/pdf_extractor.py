@@ -1,13 +1,121 @@
-from pdfminer.high_level import extract_text
 from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+from pdfminer.converter import TextConverter
+from pdfminer.layout import LAParams
 from pathlib import Path
-from typing import Tuple, Optional
+from typing import List, Tuple, Optional
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 import io
+import multiprocessing
+import threading
+from app.config import settings
 from app.core.logger import get_logger
-from app.utils.text_processing import TextProcessor
+from app.utils.text_processing import PageMap, TextProcessor
 
 logger = get_logger(__name__)
 
+# Documents up to this many pages are always parsed serially
+PARALLEL_MIN_PAGES = 5
+
+# Page counts memoized on (path, mtime, size) so an unchanged upload isn't re-walked
+PAGE_COUNT_CACHE_SIZE = 32
+_page_counts: "OrderedDict[Tuple[str, int, int], int]" = OrderedDict()
+_page_counts_lock = threading.Lock()
+
+
+def _extract_page_texts(pdf_path: str, page_numbers: Optional[List[int]] = None) -> List[str]:
+    """
+    Extract raw text per page in a single parse of the file
+    
+    Module-level so it can run in a worker process.
+    
+    Args:
+        pdf_path: Path to PDF file
+        page_numbers: Optional 0-based page indexes to extract (default: all pages)
+    
+    Returns:
+        List of raw page texts in page order
+    """
+    page_texts = []
+    
+    # Drain the converter's buffer after every page (re-running extract_text per
+    # page re-parses the whole PDF each time)
+    with open(pdf_path, 'rb') as file, io.StringIO() as output:
+        resource_manager = PDFResourceManager()
+        converter = TextConverter(resource_manager, output, laparams=LAParams())
+        interpreter = PDFPageInterpreter(resource_manager, converter)
+        
+        for page in PDFPage.get_pages(file, pagenos=page_numbers):
+            interpreter.process_page(page)
+            page_texts.append(output.getvalue())
+            output.seek(0)
+            output.truncate()
+        
+        converter.close()
+    
+    return page_texts
+
+
+def _page_count_key(pdf_path: str) -> Tuple[str, int, int]:
+    """Identify a file version by path, modification time and size"""
+    stat = Path(pdf_path).stat()
+    return str(pdf_path), stat.st_mtime_ns, stat.st_size
+
+
+def _remember_page_count(pdf_path: str, num_pages: int):
+    """Record a page count found by another pass over the file (e.g. upload validation)"""
+    key = _page_count_key(pdf_path)
+    with _page_counts_lock:
+        _page_counts[key] = num_pages
+        _page_counts.move_to_end(key)
+        while len(_page_counts) > PAGE_COUNT_CACHE_SIZE:
+            _page_counts.popitem(last=False)
+
+
+def _count_pages(pdf_path: str) -> int:
+    """
+    Count pages in a PDF, memoized so repeated calls for the same unchanged upload
+    don't re-open the file and re-walk the page tree
+    """
+    key = _page_count_key(pdf_path)
+    with _page_counts_lock:
+        if key in _page_counts:
+            _page_counts.move_to_end(key)
+            return _page_counts[key]
+    
+    with open(pdf_path, 'rb') as file:
+        num_pages = sum(1 for _ in PDFPage.get_pages(file))
+    
+    _remember_page_count(pdf_path, num_pages)
+    return num_pages
+
+
+def _extract_page_texts_pdfium(pdf_path: str) -> List[str]:
+    """
+    Extract raw text per page with PDFium (native code, much faster than pdfminer)
+    
+    Args:
+        pdf_path: Path to PDF file
+    
+    Returns:
+        List of raw page texts in page order
+    """
+    import pypdfium2 as pdfium
+    
+    page_texts = []
+    document = pdfium.PdfDocument(pdf_path)
+    try:
+        for page in document:
+            textpage = page.get_textpage()
+            page_texts.append(textpage.get_text_range())
+            textpage.close()
+            page.close()
+    finally:
+        document.close()
+    
+    return page_texts
+
 class PDFExtractor:
     """
     PDF text extraction service using pdfminer.six for high-quality digital PDF extraction
@@ -16,6 +124,25 @@ class PDFExtractor:
     
     def __init__(self):
         self.text_processor = TextProcessor()
+        self.parallel_workers = settings.PDF_EXTRACTION_WORKERS
+        self.block_size = settings.PDF_PAGE_BLOCK_SIZE
+        self._process_pool = None
+        self._process_pool_lock = threading.Lock()
+        self.backend = self._select_backend(settings.PDF_BACKEND)
+    
+    @staticmethod
+    def _select_backend(requested: str) -> str:
+        """Resolve the configured extraction backend, falling back to pdfminer"""
+        if requested == "pdfium":
+            try:
+                import pypdfium2  # noqa: F401
+                logger.info("Using PDFium for PDF text extraction")
+                return "pdfium"
+            except ImportError:
+                logger.warning("PDF_BACKEND=pdfium but pypdfium2 is not installed; using pdfminer")
+        elif requested != "pdfminer":
+            logger.warning(f"Unknown PDF_BACKEND {requested!r}; using pdfminer")
+        return "pdfminer"
     
     def extract_text_from_pdf(self, pdf_path: str) -> Tuple[str, int, bool]:
         """
@@ -35,15 +162,15 @@ class PDFExtractor:
                 logger.error(f"PDF file not found: {pdf_path}")
                 return "", 0, False
             
-            # Extract text using pdfminer
-            extracted_text = extract_text(pdf_path)
+            # Extract text page by page; the page count falls out of the same pass
+            page_texts = self._extract_raw_pages(pdf_path)
+            extracted_text = "".join(page_texts)
             
             if not extracted_text or len(extracted_text.strip()) < 100:
                 logger.warning(f"Extracted text is too short or empty from {pdf_path}")
                 return "", 0, False
             
-            # Get page count
-            num_pages = self._get_page_count(pdf_path)
+            num_pages = len(page_texts)
             
             # Clean extracted text
             cleaned_text = self.text_processor.clean_text(extracted_text)
@@ -56,7 +183,7 @@ class PDFExtractor:
             logger.error(f"Failed to extract text from PDF: {str(e)}", exc_info=True)
             return "", 0, False
     
-    def extract_text_with_page_mapping(self, pdf_path: str) -> Tuple[str, dict, int, bool]:
+    def extract_text_with_page_mapping(self, pdf_path: str) -> Tuple[str, PageMap, int, bool]:
         """
         Extract text with character-to-page mapping for location tracking
         
@@ -64,34 +191,29 @@ class PDFExtractor:
             pdf_path: Path to PDF file
         
         Returns:
-            Tuple of (full_text, char_to_page_map, num_pages, success)
+            Tuple of (full_text, char_to_page_map, num_pages, success);
+            char_to_page_map resolves offsets with PageMap.page_of
         """
         try:
             logger.info(f"Extracting text with page mapping: {pdf_path}")
             
-            full_text = ""
-            char_to_page_map = {}
+            raw_page_texts = self._extract_raw_pages(pdf_path)
+            
+            # Clean all non-empty pages in one pass over the document
+            page_numbers = [page_number for page_number, page_text in enumerate(raw_page_texts, start=1) if page_text]
+            page_texts = self.text_processor.clean_pages([raw_page_texts[page_number - 1] for page_number in page_numbers])
+            
+            char_to_page_map = PageMap()
             current_char_position = 0
-            page_number = 1
             
-            with open(pdf_path, 'rb') as file:
-                for page in PDFPage.get_pages(file):
-                    # Extract text from individual page
-                    page_text = extract_text(pdf_path, page_numbers=[page_number-1])
-                    
-                    if page_text:
-                        page_text = self.text_processor.clean_text(page_text)
-                        
-                        # Map character positions to page numbers
-                        for i in range(len(page_text)):
-                            char_to_page_map[current_char_position + i] = page_number
-                        
-                        full_text += page_text
-                        current_char_position += len(page_text)
-                    
-                    page_number += 1
-            
-            num_pages = page_number - 1
+            for page_number, page_text in zip(page_numbers, page_texts):
+                current_char_position += len(page_text)
+                
+                # Record the page boundary instead of mapping every character
+                char_to_page_map.add_page(page_number, current_char_position)
+            
+            full_text = "".join(page_texts)
+            num_pages = len(raw_page_texts)
             
             logger.info(f"Extracted {len(full_text)} characters with page mapping ({num_pages} pages)")
             
@@ -99,14 +221,57 @@ class PDFExtractor:
         
         except Exception as e:
             logger.error(f"Failed to extract text with page mapping: {str(e)}", exc_info=True)
-            return "", {}, 0, False
+            return "", PageMap(), 0, False
+    
+    def _extract_raw_pages(self, pdf_path: str) -> List[str]:
+        """
+        Extract raw page texts, splitting large documents into page blocks across
+        worker processes when PDF_EXTRACTION_WORKERS > 1 (pdfminer is pure Python)
+        """
+        if self.backend == "pdfium":
+            try:
+                return _extract_page_texts_pdfium(pdf_path)
+            except Exception as e:
+                logger.warning(f"PDFium extraction failed, retrying with pdfminer: {str(e)}")
+        
+        if self.parallel_workers > 1:
+            num_pages = self._get_page_count(pdf_path)
+            if num_pages > PARALLEL_MIN_PAGES:
+                return self._extract_raw_pages_parallel(pdf_path, num_pages)
+        
+        return _extract_page_texts(pdf_path)
+    
+    def _extract_raw_pages_parallel(self, pdf_path: str, num_pages: int) -> List[str]:
+        """Extract page blocks in worker processes and concatenate them in page order"""
+        pool = self._get_process_pool()
+        futures = [
+            pool.submit(_extract_page_texts, pdf_path, list(range(start, min(start + self.block_size, num_pages))))
+            for start in range(0, num_pages, self.block_size)
+        ]
+        
+        page_texts = []
+        for future in futures:
+            page_texts.extend(future.result())
+        
+        logger.debug(f"Extracted {num_pages} pages in {len(futures)} parallel blocks")
+        return page_texts
+    
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        """Create the PDF worker pool on first use"""
+        with self._process_pool_lock:
+            if self._process_pool is None:
+                # Spawn rather than fork: the parent holds model and torch thread state
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=self.parallel_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+                logger.info(f"Started {self.parallel_workers} PDF extraction processes")
+            return self._process_pool
     
     def _get_page_count(self, pdf_path: str) -> int:
         """Get total number of pages in PDF"""
         try:
-            with open(pdf_path, 'rb') as file:
-                pages = list(PDFPage.get_pages(file))
-                return len(pages)
+            return _count_pages(pdf_path)
         except Exception as e:
             logger.warning(f"Failed to get page count: {str(e)}")
             return 0
@@ -140,8 +305,7 @@ class PDFExtractor:
             
             # Try to open and read first page
             with open(file_path, 'rb') as file:
-                pages = list(PDFPage.get_pages(file, maxpages=1))
-                if not pages:
+                if next(PDFPage.get_pages(file, maxpages=1), None) is None:
                     return False, "PDF appears to be empty or corrupted"
             
             logger.info(f"PDF validation passed: {file_path}")
@@ -150,3 +314,68 @@ class PDFExtractor:
         except Exception as e:
             logger.error(f"PDF validation failed: {str(e)}")
             return False, f"PDF validation error: {str(e)}"
+    
+    def validate_and_probe(self, file_path: str, max_size_mb: int = 10,
+                           min_text_chars: int = 100) -> Tuple[bool, int, Optional[str]]:
+        """
+        Validate a PDF and count its pages in a single parse
+        
+        Pages are walked once; text is only extracted until enough has been seen to
+        rule out an empty or scanned document, instead of extracting the whole file.
+        
+        Args:
+            file_path: Path to PDF file
+            max_size_mb: Maximum allowed file size in MB
+            min_text_chars: Minimum extractable characters for a digital PDF
+        
+        Returns:
+            Tuple of (is_valid, num_pages, error_message)
+        """
+        try:
+            path = Path(file_path)
+            
+            if not path.exists():
+                return False, 0, "File does not exist"
+            
+            if path.suffix.lower() != '.pdf':
+                return False, 0, "File is not a PDF"
+            
+            file_size_mb = path.stat().st_size / (1024 * 1024)
+            if file_size_mb > max_size_mb:
+                return False, 0, f"File size ({file_size_mb:.2f} MB) exceeds limit ({max_size_mb} MB)"
+            
+            num_pages = 0
+            has_text = False
+            
+            with open(file_path, 'rb') as file, io.StringIO() as output:
+                resource_manager = PDFResourceManager()
+                converter = TextConverter(resource_manager, output, laparams=LAParams())
+                interpreter = PDFPageInterpreter(resource_manager, converter)
+                
+                for page in PDFPage.get_pages(file):
+                    num_pages += 1
+                    if not has_text:
+                        interpreter.process_page(page)
+                        has_text = len(output.getvalue().strip()) >= min_text_chars
+                
+                converter.close()
+            
+            if num_pages == 0:
+                return False, 0, "PDF appears to be empty or corrupted"
+            
+            if not has_text:
+                return False, num_pages, "Failed to extract text from PDF. File may be corrupted or scanned."
+            
+            # Extraction of this upload can reuse the count instead of re-opening the file
+            _remember_page_count(file_path, num_pages)
+            
+            logger.info(f"PDF validation passed: {file_path} ({num_pages} pages)")
+            return True, num_pages, None
+        
+        except Exception as e:
+            logger.error(f"PDF validation failed: {str(e)}")
+            return False, 0, f"PDF validation error: {str(e)}"
+
+
+# Singleton instance
+pdf_extractor = PDFExtractor()
@@ -1,9 +1,15 @@
 import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import google.generativeai as genai
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, Iterator, List, Dict, Optional, Tuple
 from app.config import settings
 from app.core.database import chroma_db, sqlite_db
 from app.core.logger import get_logger
+from app.services.reranker import reranker
+from app.services.response_cache import ResponseCache
+from app.utils.text_processing import TextProcessor
 import re
 
 logger = get_logger(__name__)
@@ -11,6 +17,100 @@ logger = get_logger(__name__)
 # Configure Gemini
 genai.configure(api_key=settings.GEMINI_API_KEY)
 
+GENERATION_ERROR_MESSAGE = "I apologize, but I encountered an error while processing your question. Please try again."
+
+# Pronouns that signal a follow-up question needing conversation context
+_PRONOUN_RE = re.compile(r"\b(?:it|this|that|they|these|those|he|she)\b", re.IGNORECASE)
+
+# Clause type mapping for query understanding (matched as substrings of the lowercased query)
+CLAUSE_KEYWORDS = {
+    "Agreement Date": ["agreement date", "contract date", "signing date", "execution date"],
+    "Effective Date": ["effective date", "commencement date", "start date"],
+    "Expiration Date": ["expiration date", "expiry date", "end date", "termination date"],
+    "Parties": ["parties", "party names", "who are the parties", "contracting parties"],
+    "Governing Law": ["governing law", "applicable law", "jurisdiction", "which law applies"],
+    "Termination For Convenience": ["termination", "cancel", "exit", "terminate"],
+    "Notice Period To Terminate Renewal": ["notice period", "termination notice", "cancellation notice"],
+    "Indemnity": ["indemnity", "indemnification", "liability protection"],
+    "Cap On Liability": ["liability cap", "liability limit", "maximum liability"],
+    "Uncapped Liability": ["uncapped liability", "unlimited liability"],
+    "License Grant": ["license", "license grant", "usage rights"],
+    "IP Ownership Assignment": ["ip ownership", "intellectual property", "ip rights"],
+    "Non-Compete": ["non-compete", "non compete", "competition restriction"],
+    "Confidentiality": ["confidentiality", "confidential", "nda"],
+    "Auto-Renewal": ["auto renewal", "automatic renewal", "renewal"],
+    "Payment Terms": ["payment", "fees", "pricing"],
+    "Warranty": ["warranty", "warranties", "guarantee"],
+    "Audit Rights": ["audit", "audit rights", "inspection rights"],
+    "Force Majeure": ["force majeure", "act of god"],
+    "Dispute Resolution": ["dispute", "arbitration", "litigation"],
+}
+
+# Detection table built once at import: a keyword containing a shorter keyword of the same
+# clause type can never be the deciding match, so only the minimal keywords are scanned
+_DETECTION_KEYWORDS = tuple(
+    (clause_type, tuple(
+        keyword for keyword in keywords
+        if not any(other != keyword and other in keyword for other in keywords)
+    ))
+    for clause_type, keywords in CLAUSE_KEYWORDS.items()
+)
+
+# Answer prompt; the static instructions are parsed once at import instead of per request
+# and the static preamble stays a stable prefix for Gemini's implicit prompt caching
+ANSWER_PROMPT_TEMPLATE = """You are a professional legal contract assistant with expertise in contract analysis. Your goal is to provide helpful, detailed, and conversational responses about contracts.
+
+            CONTRACT INFORMATION:
+            {context}
+
+            {history_block}
+            USER QUESTION: {query}
+
+            INSTRUCTIONS:
+            1. **Conversational Tone**: Respond naturally like ChatGPT or Gemini would - be friendly, clear, and detailed
+            2. **Comprehensive Answers**: Provide full context and explanations, not just one-line answers
+            3. **Structured Response**:
+            - Start with a direct answer to the question
+            - Provide relevant background and explanation
+            - Add context about why this matters or what it means
+            - If citing specific clauses, mention them naturally in the response
+            4. **Use Retrieved Information**: Base your answer on the contract information provided above
+            5. **General Knowledge**: You can add general legal context or explanations to make answers more helpful
+            6. **Citations**: At the end, add a brief "Source" line mentioning relevant clauses and pages
+            7. **Formatting**: Write in clear paragraphs. Use plain text (no markdown bold/italic). Use line breaks for readability.
+            8. **If Information Missing**: If the answer isn't in the provided contract sections, say so clearly but still provide helpful contexts
+
+            ANSWER:"""
+
+
+@lru_cache(maxsize=settings.RAG_MEMO_CACHE_SIZE, typed=True)
+def _format_clause_source(index: int, clause_type: str, text: str, risk_level: str,
+                          risk_score, confidence, page_number) -> str:
+    """Prompt block for an extracted clause (memoized: the same top sources recur across turns)"""
+    return (
+        f"[Extracted Clause {index}: {clause_type}]\n"
+        f"Text: {text}\n"
+        f"Risk: {risk_level} ({risk_score}/100)\n"
+        f"Confidence: {confidence*100:.0f}%\n"
+        f"Page: {page_number}\n"
+    )
+
+
+def _format_source(source: Dict, index: int) -> str:
+    """Prompt block for one retrieved source"""
+    if source["type"] == "extracted_clause":
+        return _format_clause_source(
+            index,
+            source["clause_type"],
+            source["text"],
+            source["risk_level"],
+            source["risk_score"],
+            source.get("confidence", 0),
+            source.get("page_number", "N/A")
+        )
+    return f"[Contract Text Section {index}]\n{source['text']}\n"
+
+
 class RAGService:
     """
     Enhanced Retrieval-Augmented Generation service with multi-stage retrieval
@@ -20,60 +120,40 @@ class RAGService:
     def __init__(self):
         self.chroma = chroma_db
         self.sqlite = sqlite_db
+        self.reranker = reranker
         
         # Initialize Gemini model
         self.model = genai.GenerativeModel('gemini-2.5-flash-lite')
         
-        # Clause type mapping for query understanding
-        self.clause_keywords = {
-            "Agreement Date": ["agreement date", "contract date", "signing date", "execution date"],
-            "Effective Date": ["effective date", "commencement date", "start date"],
-            "Expiration Date": ["expiration date", "expiry date", "end date", "termination date"],
-            "Parties": ["parties", "party names", "who are the parties", "contracting parties"],
-            "Governing Law": ["governing law", "applicable law", "jurisdiction", "which law applies"],
-            "Termination For Convenience": ["termination", "cancel", "exit", "terminate"],
-            "Notice Period To Terminate Renewal": ["notice period", "termination notice", "cancellation notice"],
-            "Indemnity": ["indemnity", "indemnification", "liability protection"],
-            "Cap On Liability": ["liability cap", "liability limit", "maximum liability"],
-            "Uncapped Liability": ["uncapped liability", "unlimited liability"],
-            "License Grant": ["license", "license grant", "usage rights"],
-            "IP Ownership Assignment": ["ip ownership", "intellectual property", "ip rights"],
-            "Non-Compete": ["non-compete", "non compete", "competition restriction"],
-            "Confidentiality": ["confidentiality", "confidential", "nda"],
-            "Auto-Renewal": ["auto renewal", "automatic renewal", "renewal"],
-            "Payment Terms": ["payment", "fees", "pricing"],
-            "Warranty": ["warranty", "warranties", "guarantee"],
-            "Audit Rights": ["audit", "audit rights", "inspection rights"],
-            "Force Majeure": ["force majeure", "act of god"],
-            "Dispute Resolution": ["dispute", "arbitration", "litigation"],
-        }
+        # Memoized reformulations (keyed by query + recent turns) and retrieved sources
+        # (keyed by doc_id + queries; dropped when the document is re-indexed)
+        self.reformulation_cache = ResponseCache(maxsize=settings.RAG_MEMO_CACHE_SIZE)
+        self.retrieval_cache = ResponseCache(maxsize=settings.RAG_MEMO_CACHE_SIZE)
+        
+        # Runs stage-1 exact clause lookups alongside the semantic search
+        self._retrieval_executor = ThreadPoolExecutor(
+            max_workers=settings.RETRIEVAL_WORKERS,
+            thread_name_prefix="retrieval"
+        )
         
         logger.info("RAG service initialized with Gemini 2.5 Flash")
     
-    def index_document(self, doc_id: str, contract_text: str, extracted_clauses: Dict[str, Dict]):
+    def _iter_index_payload(self, doc_id: str, contract_text: str,
+                            extracted_clauses: Dict[str, Dict]) -> Iterator[Tuple[str, Dict, str]]:
         """
-        Index contract text and extracted clauses in ChromaDB with enhanced metadata
+        Lazily build the ChromaDB items for a contract
         
-        Args:
-            doc_id: Document identifier
-            contract_text: Full contract text
-            extracted_clauses: Dictionary of extracted clauses with metadata
+        Yields:
+            (document, metadata, id) tuples: extracted clauses, then original text chunks,
+            then the full text preview
         """
-        logger.info(f"Indexing document {doc_id} in ChromaDB")
-        
-        try:
-            collection = self.chroma.get_or_create_collection(f"contract_{doc_id}")
-            
-            documents = []
-            metadatas = []
-            ids = []
-            
-            # 1. Index extracted clauses FIRST (highest priority)
-            for clause_type, clause_info in extracted_clauses.items():
-                if clause_info["found"] and clause_info["extracted_text"]:
-                    # Add clause with full metadata
-                    documents.append(clause_info["extracted_text"])
-                    metadatas.append({
+        # 1. Index extracted clauses FIRST (highest priority)
+        for clause_type, clause_info in extracted_clauses.items():
+            if clause_info["found"] and clause_info["extracted_text"]:
+                # Add clause with full metadata
+                yield (
+                    clause_info["extracted_text"],
+                    {
                         "type": "extracted_clause",
                         "doc_id": doc_id,
                         "clause_type": clause_type,
@@ -83,52 +163,80 @@ class RAGService:
                         "confidence": float(clause_info["confidence"]),
                         "page_number": clause_info.get("page_number", 0),
                         "found": True
-                    })
-                    ids.append(f"{doc_id}_clause_{clause_type.replace(' ', '_')}")
-            
-            # 2. Index original contract in smaller, overlapping chunks for better retrieval
-            chunk_size = 800  # Smaller chunks for more precise retrieval
-            overlap = 200
-            
-            chunk_id = 0
-            for i in range(0, len(contract_text), chunk_size - overlap):
-                chunk_text = contract_text[i:i + chunk_size]
-                
-                if len(chunk_text.strip()) < 50:  # Skip tiny chunks
-                    continue
-                
-                documents.append(chunk_text)
-                metadatas.append({
+                    },
+                    f"{doc_id}_clause_{clause_type.replace(' ', '_')}"
+                )
+        
+        # 2. Index original contract in smaller, overlapping chunks for better retrieval
+        # all-MiniLM-L6-v2 truncates at 256 word pieces; dense legal text (numbers,
+        # citations) can pass that well before 1000 chars, so windows stay at ~800
+        chunk_size = 800
+        overlap = 150
+        
+        # Windows end on sentence/word boundaries so chunks don't cut mid-sentence
+        chunk_id = 0
+        for start, end in TextProcessor.split_on_boundaries(contract_text, chunk_size, overlap):
+            chunk_text = contract_text[start:end]
+            if len(chunk_text.strip()) < 50:  # Skip tiny chunks
+                continue
+            
+            yield (
+                chunk_text,
+                {
                     "type": "original_chunk",
                     "doc_id": doc_id,
                     "chunk_id": chunk_id,
-                    "char_start": i,
-                    "char_end": min(i + chunk_size, len(contract_text))
-                })
-                ids.append(f"{doc_id}_chunk_{chunk_id}")
-                chunk_id += 1
-            
-            # 3. Index full contract text as well (for broad searches)
-            documents.append(contract_text[:10000])  # First 10k chars as overview
-            metadatas.append({
+                    "char_start": start,
+                    "char_end": end
+                },
+                f"{doc_id}_chunk_{chunk_id}"
+            )
+            chunk_id += 1
+        
+        # 3. Index full contract text as well (for broad searches)
+        yield (
+            contract_text[:10000],  # First 10k chars as overview
+            {
                 "type": "full_text_preview",
                 "doc_id": doc_id,
                 "length": len(contract_text)
-            })
-            ids.append(f"{doc_id}_fulltext_preview")
+            },
+            f"{doc_id}_fulltext_preview"
+        )
+    
+    def index_document(self, doc_id: str, contract_text: str, extracted_clauses: Dict[str, Dict]):
+        """
+        Index contract text and extracted clauses in ChromaDB with enhanced metadata
+        
+        Args:
+            doc_id: Document identifier
+            contract_text: Full contract text
+            extracted_clauses: Dictionary of extracted clauses with metadata
+        """
+        logger.info(f"Indexing document {doc_id} in ChromaDB")
+        
+        try:
+            collection = self.chroma.get_or_create_collection(f"contract_{doc_id}")
+            
+            type_counts = Counter()
             
-            # Add all to ChromaDB
-            self.chroma.add_documents(
+            def counted(items):
+                for item in items:
+                    type_counts[item[1]["type"]] += 1
+                    yield item
+            
+            # Stream to ChromaDB one batch at a time; unchanged texts from a previous run
+            # keep their embeddings
+            self.chroma.sync_documents(
                 collection_name=f"contract_{doc_id}",
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
+                items=counted(self._iter_index_payload(doc_id, contract_text, extracted_clauses))
             )
+            self.retrieval_cache.invalidate_document(doc_id)
             
-            logger.info(f"Successfully indexed {len(documents)} items for document {doc_id}")
-            logger.info(f"  - Extracted clauses: {sum(1 for m in metadatas if m['type'] == 'extracted_clause')}")
-            logger.info(f"  - Original chunks: {sum(1 for m in metadatas if m['type'] == 'original_chunk')}")
-            logger.info(f"  - Full text preview: {sum(1 for m in metadatas if m['type'] == 'full_text_preview')}")
+            logger.info(f"Successfully indexed {sum(type_counts.values())} items for document {doc_id}")
+            logger.info(f"  - Extracted clauses: {type_counts['extracted_clause']}")
+            logger.info(f"  - Original chunks: {type_counts['original_chunk']}")
+            logger.info(f"  - Full text preview: {type_counts['full_text_preview']}")
         
         except Exception as e:
             logger.error(f"Failed to index document: {str(e)}", exc_info=True)
@@ -149,30 +257,16 @@ class RAGService:
         logger.info(f"Processing query for session {session_id}, doc {doc_id}: '{user_query}'")
         
         try:
-            # 1. Retrieve conversation history
-            history = self.sqlite.get_conversation_history(
-                session_id=session_id,
-                limit=settings.CONVERSATION_HISTORY_LENGTH
-            )
-            
-            # 2. Reformulate query if needed (add context from history)
-            reformulated_query = self._reformulate_query(user_query, history)
-            logger.debug(f"Reformulated query: '{reformulated_query}'")
-            
-            # 3. ENHANCED MULTI-STAGE RETRIEVAL
-            sources = self._retrieve_relevant_chunks_enhanced(doc_id, reformulated_query, user_query)
-            
-            logger.info(f"Retrieved {len(sources)} sources for query")
+            # 1-3. History, reformulation and multi-stage retrieval
+            history, reformulated_query, sources = self._prepare_answer(session_id, doc_id, user_query)
             
             # 4. Generate answer using Gemini
             answer = self._generate_answer(reformulated_query, sources, history)
             
             # 5. Save conversation turn
-            turn_number = len(history) + 1
-            self.sqlite.save_conversation_turn(
+            turn_number = self.sqlite.append_conversation_turn(
                 session_id=session_id,
                 doc_id=doc_id,
-                turn_number=turn_number,
                 user_query=user_query,
                 ai_response=answer,
                 reformulated_query=reformulated_query if reformulated_query != user_query else None
@@ -184,13 +278,146 @@ class RAGService:
                 "answer": answer,
                 "sources": sources,
                 "reformulated_query": reformulated_query if reformulated_query != user_query else None,
-                "turn_number": turn_number
+                "turn_number": turn_number,
+                "used_history": bool(history)
             }
         
         except Exception as e:
             logger.error(f"Failed to answer query: {str(e)}", exc_info=True)
             raise
     
+    def stream_answer(self, session_id: str, doc_id: str, user_query: str,
+                      on_complete: Optional[Callable[[Dict], None]] = None) -> Iterator[str]:
+        """
+        Answer user query like answer_query, streaming the answer text as Gemini produces it
+        
+        History, reformulation and retrieval run before this returns, so their failures
+        raise here rather than mid-stream. The turn is saved when the stream ends, including
+        the partial answer if the client disconnects and the iterator is closed early.
+        
+        Args:
+            session_id: Session identifier
+            doc_id: Document identifier
+            user_query: User's question
+            on_complete: Called with the answer_query-shaped result once the full answer
+                has been streamed (not when the stream is cut short)
+        
+        Returns:
+            Iterator over answer text chunks
+        """
+        logger.info(f"Processing streamed query for session {session_id}, doc {doc_id}: '{user_query}'")
+        
+        try:
+            history, reformulated_query, sources = self._prepare_answer(session_id, doc_id, user_query)
+        except Exception as e:
+            logger.error(f"Failed to answer query: {str(e)}", exc_info=True)
+            raise
+        
+        return self._stream_generation(session_id, doc_id, user_query, reformulated_query,
+                                       sources, history, on_complete)
+    
+    def _prepare_answer(self, session_id: str, doc_id: str,
+                        user_query: str) -> Tuple[List[Dict], str, List[Dict]]:
+        """
+        Load history, reformulate the query and retrieve its sources
+        
+        Returns:
+            Tuple of (history, reformulated_query, sources)
+        """
+        # 1. Retrieve conversation history
+        history = self.sqlite.get_conversation_history(
+            session_id=session_id,
+            limit=settings.CONVERSATION_HISTORY_LENGTH
+        )
+        
+        # 2. Reformulate query if needed (add context from history)
+        reformulated_query = self._reformulate_query(user_query, history)
+        logger.debug(f"Reformulated query: '{reformulated_query}'")
+        
+        # 3. ENHANCED MULTI-STAGE RETRIEVAL
+        sources = self._retrieve_cached(doc_id, reformulated_query, user_query)
+        
+        logger.info(f"Retrieved {len(sources)} sources for query")
+        
+        return history, reformulated_query, sources
+    
+    def _stream_generation(self, session_id: str, doc_id: str, user_query: str,
+                           reformulated_query: str, sources: List[Dict],
+                           history: List[Dict],
+                           on_complete: Optional[Callable[[Dict], None]] = None) -> Iterator[str]:
+        """Yield Gemini's answer chunks, then save the turn (in finally, so early closes save too)"""
+        parts = []
+        completed = False
+        try:
+            try:
+                response = self.model.generate_content(
+                    self._build_prompt(reformulated_query, sources, history),
+                    stream=True
+                )
+                for chunk in response:
+                    text = chunk.text if parts else chunk.text.lstrip()
+                    if text:
+                        parts.append(text)
+                        yield text
+                completed = True
+            except Exception as e:
+                logger.error(f"Failed to stream answer: {str(e)}", exc_info=True)
+                if not parts:
+                    parts.append(GENERATION_ERROR_MESSAGE)
+                    yield GENERATION_ERROR_MESSAGE
+        
+        finally:
+            if not parts:
+                logger.info(f"Stream closed before any answer text for session {session_id}")
+            else:
+                self._finish_stream(session_id, doc_id, user_query, reformulated_query, sources,
+                                    history, "".join(parts).strip(), completed, on_complete)
+    
+    def _finish_stream(self, session_id: str, doc_id: str, user_query: str, reformulated_query: str,
+                       sources: List[Dict], history: List[Dict], answer: str, completed: bool,
+                       on_complete: Optional[Callable[[Dict], None]]):
+        """Save a streamed turn and hand a fully generated result to on_complete (never raises)"""
+        try:
+            reformulated = reformulated_query if reformulated_query != user_query else None
+            turn_number = self.sqlite.append_conversation_turn(
+                session_id=session_id,
+                doc_id=doc_id,
+                user_query=user_query,
+                ai_response=answer,
+                reformulated_query=reformulated
+            )
+            
+            if not completed:
+                logger.info(f"Streamed answer cut short, saved partial turn {turn_number}")
+                return
+            
+            logger.info(f"Streamed query answered (turn {turn_number})")
+            if on_complete is not None:
+                on_complete({
+                    "answer": answer,
+                    "sources": sources,
+                    "reformulated_query": reformulated,
+                    "turn_number": turn_number,
+                    "used_history": bool(history)
+                })
+        
+        except Exception as e:
+            logger.error(f"Failed to save streamed turn: {str(e)}", exc_info=True)
+    
+    def record_turn(self, session_id: str, doc_id: str, user_query: str, answer: str) -> int:
+        """
+        Append an already-answered turn (e.g. served from cache) to the session history
+        
+        Returns:
+            Turn number assigned to the saved turn
+        """
+        return self.sqlite.append_conversation_turn(
+            session_id=session_id,
+            doc_id=doc_id,
+            user_query=user_query,
+            ai_response=answer
+        )
+    
     def _detect_clause_types(self, query: str) -> List[str]:
         """
         Detect which clause types the user is asking about based on keywords
@@ -204,7 +431,7 @@ class RAGService:
         query_lower = query.lower()
         detected_clauses = []
         
-        for clause_type, keywords in self.clause_keywords.items():
+        for clause_type, keywords in _DETECTION_KEYWORDS:
             for keyword in keywords:
                 if keyword in query_lower:
                     detected_clauses.append(clause_type)
@@ -213,6 +440,104 @@ class RAGService:
         
         return detected_clauses
     
+    def _fetch_exact_clause_matches(self, collection_name: str,
+                                    clause_types: List[str]) -> List[Tuple[str, Dict]]:
+        """
+        Fetch the indexed extracted clauses of the given types
+        
+        Each clause type is indexed at most once, so one metadata lookup replaces a
+        similarity query per type.
+        
+        Returns:
+            (document, metadata) pairs in clause_types order, at most 2 per type
+        """
+        results = self.chroma.get_documents(
+            collection_name=collection_name,
+            where={
+                "$and": [
+                    {"type": {"$eq": "extracted_clause"}},
+                    {"clause_type": {"$in": clause_types}}
+                ]
+            }
+        )
+        
+        matches_by_type = {}
+        for doc, metadata in zip(results["documents"], results["metadatas"]):
+            matches_by_type.setdefault(metadata.get("clause_type"), []).append((doc, metadata))
+        
+        return [match for clause_type in clause_types for match in matches_by_type.get(clause_type, [])[:2]]
+    
+    def _query_top_by_type(
+        self,
+        collection_name: str,
+        query: str,
+        query_embeddings: Optional[List[List[float]]],
+        quotas: Dict[str, int]
+    ) -> Dict[str, List[Tuple[str, Dict]]]:
+        """
+        Nearest hits per document type from one combined vector search
+        
+        A combined ranking holds the exact top-k of every type that reaches its quota, so
+        only a type that was crowded out by the others needs its own filtered query.
+        
+        Args:
+            collection_name: Collection to search
+            query: Query text (used if query_embeddings is None)
+            query_embeddings: Precomputed query embedding
+            quotas: Number of hits wanted per metadata "type"
+        
+        Returns:
+            Dictionary mapping type to (document, metadata) pairs, nearest first
+        """
+        n_results = 2 * sum(quotas.values())
+        results = self.chroma.query_documents(
+            collection_name=collection_name,
+            query_texts=[query],
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where={"type": {"$in": list(quotas)}}
+        )
+        
+        hits = {doc_type: [] for doc_type in quotas}
+        for doc, metadata in zip(results["documents"][0], results["metadatas"][0]):
+            bucket = hits.get(metadata.get("type"))
+            if bucket is not None and len(bucket) < quotas[metadata["type"]]:
+                bucket.append((doc, metadata))
+        
+        # Fewer results than requested means every matching item was returned
+        exhausted = len(results["documents"][0]) < n_results
+        
+        for doc_type, quota in quotas.items():
+            if len(hits[doc_type]) < quota and not exhausted:
+                type_results = self.chroma.query_documents(
+                    collection_name=collection_name,
+                    query_texts=[query],
+                    query_embeddings=query_embeddings,
+                    n_results=quota,
+                    where={"type": {"$eq": doc_type}}
+                )
+                hits[doc_type] = list(zip(type_results["documents"][0], type_results["metadatas"][0]))
+        
+        return hits
+    
+    def _retrieve_cached(self, doc_id: str, reformulated_query: str, original_query: str) -> List[Dict]:
+        """Multi-stage retrieval, memoized per document and normalized query pair"""
+        cache_key = (
+            doc_id,
+            ResponseCache.normalize_query(reformulated_query),
+            ResponseCache.normalize_query(original_query)
+        )
+        
+        sources = self.retrieval_cache.get(cache_key)
+        if sources is not None:
+            logger.debug(f"Retrieval cache hit for doc {doc_id}")
+            return sources
+        
+        sources = self._retrieve_relevant_chunks_enhanced(doc_id, reformulated_query, original_query)
+        if sources:  # An empty list may be a swallowed retrieval error; don't pin it
+            self.retrieval_cache.set(cache_key, sources)
+        return sources
+    
     def _retrieve_relevant_chunks_enhanced(self, doc_id: str, reformulated_query: str, original_query: str) -> List[Dict]:
         """
         ENHANCED MULTI-STAGE RETRIEVAL with prioritization (FIXED ChromaDB syntax)
@@ -222,61 +547,41 @@ class RAGService:
             all_sources = []
             seen_texts = set()
             
-            # STAGE 1: Exact clause type matching
+            # STAGE 1: Exact clause type matching (a metadata lookup that needs no embedding,
+            # so it runs in the background while the query is embedded and searched)
             detected_clause_types = self._detect_clause_types(original_query)
+            exact_matches = None
             
             if detected_clause_types:
                 logger.info(f"Stage 1: Detected clause types: {detected_clause_types}")
-                
-                for clause_type in detected_clause_types:
-                    try:
-                        # FIXED: Proper ChromaDB where syntax
-                        exact_match_results = self.chroma.query_documents(
-                            collection_name=collection_name,
-                            query_texts=[clause_type],
-                            n_results=2,
-                            where={
-                                "$and": [
-                                    {"type": {"$eq": "extracted_clause"}},
-                                    {"clause_type": {"$eq": clause_type}}
-                                ]
-                            }
-                        )
-                        
-                        if exact_match_results["documents"][0]:
-                            for i, doc in enumerate(exact_match_results["documents"][0]):
-                                metadata = exact_match_results["metadatas"][0][i]
-                                
-                                if doc not in seen_texts:
-                                    all_sources.append({
-                                        "text": doc,
-                                        "type": "extracted_clause",
-                                        "clause_type": metadata.get("clause_type"),
-                                        "risk_level": metadata.get("risk_level"),
-                                        "risk_score": metadata.get("risk_score"),
-                                        "page_number": metadata.get("page_number"),
-                                        "confidence": metadata.get("confidence"),
-                                        "priority": 1
-                                    })
-                                    seen_texts.add(doc)
-                                    logger.debug(f"Stage 1: Added exact match for '{clause_type}'")
-                    except Exception as e:
-                        logger.warning(f"Stage 1 failed for '{clause_type}': {str(e)}")
+                exact_matches = self._retrieval_executor.submit(
+                    self._fetch_exact_clause_matches, collection_name, detected_clause_types
+                )
             
-            # STAGE 2: Semantic search on extracted clauses (FIXED)
-            logger.info("Stage 2: Semantic search on extracted clauses")
+            # Embed the reformulated query once and reuse the vector across all stages
             try:
-                clause_results = self.chroma.query_documents(
-                    collection_name=collection_name,
-                    query_texts=[reformulated_query],
-                    n_results=5,
-                    where={"type": {"$eq": "extracted_clause"}}
+                query_embeddings = self.chroma.embed_queries([reformulated_query])
+            except Exception as e:
+                logger.warning(f"Query embedding failed, letting ChromaDB embed per stage: {str(e)}")
+                query_embeddings = None
+            
+            # STAGES 2-3: Semantic search on extracted clauses, then original text,
+            # served by one combined vector search
+            logger.info("Stages 2-3: Semantic search on extracted clauses and original text")
+            try:
+                hits_by_type = self._query_top_by_type(
+                    collection_name,
+                    reformulated_query,
+                    query_embeddings,
+                    {"extracted_clause": 5, "original_chunk": 8}
                 )
-                
-                if clause_results["documents"][0]:
-                    for i, doc in enumerate(clause_results["documents"][0]):
-                        metadata = clause_results["metadatas"][0][i]
-                        
+            except Exception as e:
+                logger.warning(f"Stages 2-3 failed: {str(e)}")
+                hits_by_type = {}
+            
+            if exact_matches is not None:
+                try:
+                    for doc, metadata in exact_matches.result():
                         if doc not in seen_texts:
                             all_sources.append({
                                 "text": doc,
@@ -286,39 +591,39 @@ class RAGService:
                                 "risk_score": metadata.get("risk_score"),
                                 "page_number": metadata.get("page_number"),
                                 "confidence": metadata.get("confidence"),
-                                "priority": 2
+                                "priority": 1
                             })
                             seen_texts.add(doc)
-                            logger.debug(f"Stage 2: Added clause '{metadata.get('clause_type')}'")
-            except Exception as e:
-                logger.warning(f"Stage 2 failed: {str(e)}")
+                            logger.debug(f"Stage 1: Added exact match for '{metadata.get('clause_type')}'")
+                except Exception as e:
+                    logger.warning(f"Stage 1 failed: {str(e)}")
             
-            # STAGE 3: Semantic search on original text (FIXED)
-            logger.info("Stage 3: Semantic search on original text")
-            try:
-                text_results = self.chroma.query_documents(
-                    collection_name=collection_name,
-                    query_texts=[reformulated_query],
-                    n_results=8,
-                    where={"type": {"$eq": "original_chunk"}}
-                )
-                
-                if text_results["documents"][0]:
-                    for i, doc in enumerate(text_results["documents"][0]):
-                        metadata = text_results["metadatas"][0][i]
-                        
-                        if doc not in seen_texts:
-                            all_sources.append({
-                                "text": doc,
-                                "type": "original_chunk",
-                                "char_start": metadata.get("char_start"),
-                                "char_end": metadata.get("char_end"),
-                                "priority": 3
-                            })
-                            seen_texts.add(doc)
-                            logger.debug(f"Stage 3: Added original chunk {metadata.get('chunk_id')}")
-            except Exception as e:
-                logger.warning(f"Stage 3 failed: {str(e)}")
+            for doc, metadata in hits_by_type.get("extracted_clause", []):
+                if doc not in seen_texts:
+                    all_sources.append({
+                        "text": doc,
+                        "type": "extracted_clause",
+                        "clause_type": metadata.get("clause_type"),
+                        "risk_level": metadata.get("risk_level"),
+                        "risk_score": metadata.get("risk_score"),
+                        "page_number": metadata.get("page_number"),
+                        "confidence": metadata.get("confidence"),
+                        "priority": 2
+                    })
+                    seen_texts.add(doc)
+                    logger.debug(f"Stage 2: Added clause '{metadata.get('clause_type')}'")
+            
+            for doc, metadata in hits_by_type.get("original_chunk", []):
+                if doc not in seen_texts:
+                    all_sources.append({
+                        "text": doc,
+                        "type": "original_chunk",
+                        "char_start": metadata.get("char_start"),
+                        "char_end": metadata.get("char_end"),
+                        "priority": 3
+                    })
+                    seen_texts.add(doc)
+                    logger.debug(f"Stage 3: Added original chunk {metadata.get('chunk_id')}")
             
             # STAGE 4: Broad search if needed
             if len(all_sources) < 5:
@@ -327,6 +632,7 @@ class RAGService:
                     broad_results = self.chroma.query_documents(
                         collection_name=collection_name,
                         query_texts=[reformulated_query],
+                        query_embeddings=query_embeddings,
                         n_results=10
                     )
                     
@@ -346,9 +652,11 @@ class RAGService:
                 except Exception as e:
                     logger.warning(f"Stage 4 failed: {str(e)}")
             
-            # Sort by priority
+            # Sort by priority, then let the cross-encoder reorder the top candidates
             all_sources.sort(key=lambda x: x.get("priority", 999))
-            final_sources = all_sources[:10]
+            final_sources = self.reranker.rerank(
+                reformulated_query, all_sources[:settings.RERANK_CANDIDATES], top_k=10
+            )
             
             logger.info(f"Multi-stage retrieval complete: {len(final_sources)} sources")
             logger.info(f"  - Priority 1 (Exact match): {sum(1 for s in final_sources if s.get('priority') == 1)}")
@@ -377,13 +685,8 @@ class RAGService:
         if not history or len(history) == 0:
             return query
         
-        query_lower = query.lower()
-        pronouns = ["it", "this", "that", "they", "these", "those", "he", "she"]
-        
         # Check if query contains pronouns or is very short
-        has_pronoun = any(pronoun in query_lower.split() for pronoun in pronouns)
-        
-        if not has_pronoun and len(query.split()) > 3:
+        if not _PRONOUN_RE.search(query) and len(query.split()) > 3:
             return query
         
         # Get last 2 conversation turns for context
@@ -392,6 +695,14 @@ class RAGService:
         if not recent_context:
             return query
         
+        cache_key = (
+            ResponseCache.normalize_query(query),
+            tuple((turn['user_query'], turn['ai_response']) for turn in recent_context)
+        )
+        cached = self.reformulation_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         context_str = "\n".join([
             f"Q: {turn['user_query']}\nA: {turn['ai_response']}"
             for turn in recent_context
@@ -410,6 +721,7 @@ Reformulated Question:"""
             
             response = self.model.generate_content(prompt)
             reformulated = response.text.strip()
+            self.reformulation_cache.set(cache_key, reformulated)
             
             logger.debug(f"Reformulated '{query}' to '{reformulated}'")
             
@@ -419,6 +731,29 @@ Reformulated Question:"""
             logger.warning(f"Reformulation failed: {str(e)}")
             return query
     
+    def _build_prompt(self, query: str, sources: List[Dict], history: List[Dict]) -> str:
+        """Fill the answer prompt with the sources, recent history and the question"""
+        # Build context from sources (with priority indicators)
+        context_str = "\n".join(
+            _format_source(source, i) for i, source in enumerate(sources, 1)
+        )
+        
+        # Build conversation history
+        history_block = ""
+        if history and len(history) > 0:
+            recent_history = history[-3:]  # Last 3 turns
+            history_str = "\n".join([
+                f"User: {turn['user_query']}\nAssistant: {turn['ai_response']}"
+                for turn in recent_history
+            ])
+            history_block = f"CONVERSATION HISTORY:\n{history_str}\n"
+        
+        return ANSWER_PROMPT_TEMPLATE.format_map({
+            "context": context_str,
+            "history_block": history_block,
+            "query": query
+        })
+    
     def _generate_answer(self, query: str, sources: List[Dict], history: List[Dict]) -> str:
         """
         Generate answer using Gemini with retrieved sources and history
@@ -432,66 +767,8 @@ Reformulated Question:"""
             Generated answer
         """
         try:
-            # Build context from sources (with priority indicators)
-            context_parts = []
-            
-            for i, source in enumerate(sources, 1):
-                if source["type"] == "extracted_clause":
-                    context_parts.append(
-                        f"[Extracted Clause {i}: {source['clause_type']}]\n"
-                        f"Text: {source['text']}\n"
-                        f"Risk: {source['risk_level']} ({source['risk_score']}/100)\n"
-                        f"Confidence: {source.get('confidence', 0)*100:.0f}%\n"
-                        f"Page: {source.get('page_number', 'N/A')}\n"
-                    )
-                else:
-                    context_parts.append(
-                        f"[Contract Text Section {i}]\n"
-                        f"{source['text']}\n"
-                    )
-            
-            context_str = "\n".join(context_parts)
-            
-            # Build conversation history
-            history_str = ""
-            if history and len(history) > 0:
-                recent_history = history[-3:]  # Last 3 turns
-                history_str = "\n".join([
-                    f"User: {turn['user_query']}\nAssistant: {turn['ai_response']}"
-                    for turn in recent_history
-                ])
-            
-            history_block = ""
-            if history_str:
-                history_block = "CONVERSATION HISTORY:\n" + history_str + "\n"
-
-            prompt = f"""You are a professional legal contract assistant with expertise in contract analysis. Your goal is to provide helpful, detailed, and conversational responses about contracts.
-
-            CONTRACT INFORMATION:
-            {context_str}
-
-            {history_block}
-            USER QUESTION: {query}
-
-            INSTRUCTIONS:
-            1. **Conversational Tone**: Respond naturally like ChatGPT or Gemini would - be friendly, clear, and detailed
-            2. **Comprehensive Answers**: Provide full context and explanations, not just one-line answers
-            3. **Structured Response**:
-            - Start with a direct answer to the question
-            - Provide relevant background and explanation
-            - Add context about why this matters or what it means
-            - If citing specific clauses, mention them naturally in the response
-            4. **Use Retrieved Information**: Base your answer on the contract information provided above
-            5. **General Knowledge**: You can add general legal context or explanations to make answers more helpful
-            6. **Citations**: At the end, add a brief "Source" line mentioning relevant clauses and pages
-            7. **Formatting**: Write in clear paragraphs. Use plain text (no markdown bold/italic). Use line breaks for readability.
-            8. **If Information Missing**: If the answer isn't in the provided contract sections, say so clearly but still provide helpful contexts
-
-            ANSWER:"""
-
-            
             # Generate response
-            response = self.model.generate_content(prompt)
+            response = self.model.generate_content(self._build_prompt(query, sources, history))
             answer = response.text.strip()
             
             logger.debug(f"Generated answer: {answer[:150]}...")
@@ -500,4 +777,8 @@ Reformulated Question:"""
         
         except Exception as e:
             logger.error(f"Failed to generate answer: {str(e)}", exc_info=True)
-            return "I apologize, but I encountered an error while processing your question. Please try again."
+            return GENERATION_ERROR_MESSAGE
+
+
+# Singleton instance
+rag_service = RAGService()
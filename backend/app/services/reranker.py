@@ -0,0 +1,67 @@
+from typing import Dict, List
+from app.config import settings
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class Reranker:
+    """
+    Cross-encoder reranker for retrieved sources
+    Scores each (query, source text) pair jointly in one batched forward pass, so the
+    final context is ordered by relevance to the question rather than by retrieval stage
+    """
+
+    def __init__(self, model_name: str = None):
+        self.model_name = settings.RERANKER_MODEL if model_name is None else model_name
+        self.model = None
+
+        if not self.model_name:
+            logger.info("Reranker disabled (no RERANKER_MODEL configured)")
+            return
+
+        try:
+            from sentence_transformers import CrossEncoder
+            self.model = CrossEncoder(self.model_name, device=settings.DEVICE)
+            logger.info(f"Reranker initialized with {self.model_name}")
+        except Exception as e:
+            logger.warning(f"Reranker disabled: {str(e)}")
+
+    @property
+    def enabled(self) -> bool:
+        return self.model is not None
+
+    def rerank(self, query: str, sources: List[Dict], top_k: int) -> List[Dict]:
+        """
+        Order sources by cross-encoder score, keeping retrieval priority as the tie-breaker
+
+        Args:
+            query: Query the sources were retrieved for
+            sources: Candidate sources, already in priority order
+            top_k: Number of sources to keep
+
+        Returns:
+            Up to top_k sources, best first (unchanged order if the reranker is unavailable)
+        """
+        if not self.enabled or len(sources) < 2:
+            return sources[:top_k]
+
+        try:
+            scores = self.model.predict(
+                [(query, source["text"]) for source in sources],
+                batch_size=settings.RERANK_BATCH_SIZE,
+                show_progress_bar=False
+            )
+        except Exception as e:
+            logger.warning(f"Reranking failed, keeping priority order: {str(e)}")
+            return sources[:top_k]
+
+        order = sorted(
+            range(len(sources)),
+            key=lambda i: (-float(scores[i]), sources[i].get("priority", 999))
+        )
+        return [sources[i] for i in order[:top_k]]
+
+
+# Singleton instance
+reranker = Reranker()
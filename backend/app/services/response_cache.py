@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from app.config import settings
+from app.core.database import chroma_db
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class ResponseCache:
+    """
+    In-memory LRU cache with per-entry TTL for RAG chat answers
+    Keyed by (doc_id, normalized query) so repeated questions skip retrieval and Gemini
+    """
+
+    def __init__(self, maxsize: int = None, ttl: int = None):
+        self.maxsize = settings.RESPONSE_CACHE_SIZE if maxsize is None else maxsize
+        self.ttl = settings.RESPONSE_CACHE_TTL if ttl is None else ttl
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Lowercase a query and collapse its whitespace"""
+        return " ".join(query.lower().split())
+
+    @staticmethod
+    def make_key(doc_id: str, query: str) -> Tuple[str, str]:
+        """Build a cache key from document ID and a normalized query"""
+        return doc_id, ResponseCache.normalize_query(query)
+
+    def get(self, key: Tuple[str, str]) -> Optional[Dict]:
+        """Return the cached result for key, or None on miss/expiry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Tuple[str, str], value: Dict):
+        """Store a result, evicting the least recently used entry when full"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate_document(self, doc_id: str):
+        """Drop all cached answers for a document (e.g. after re-indexing)"""
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == doc_id]
+            for key in stale:
+                del self._entries[key]
+
+        if stale:
+            logger.debug(f"Invalidated {len(stale)} cached responses for document {doc_id}")
+
+
+class SemanticResponseCache:
+    """
+    Embedding-similarity cache for paraphrased chat queries
+    Stores normalized query embeddings per document and serves the cached answer when
+    the best cosine similarity exceeds the configured threshold. Off unless
+    SEMANTIC_CACHE_ENABLED is set; queries are embedded with the RAG embedding function.
+    """
+
+    def __init__(self, threshold: float = None, max_entries_per_doc: int = None, enabled: bool = None):
+        self.threshold = settings.SEMANTIC_CACHE_THRESHOLD if threshold is None else threshold
+        self.max_entries_per_doc = (
+            settings.SEMANTIC_CACHE_MAX_ENTRIES if max_entries_per_doc is None else max_entries_per_doc
+        )
+        self.enabled = settings.SEMANTIC_CACHE_ENABLED if enabled is None else enabled
+        self._docs: Dict[str, Dict] = {}
+        self._tick = 0
+        self._lock = threading.Lock()
+
+        if self.enabled:
+            logger.info(f"Semantic response cache enabled (threshold={self.threshold})")
+
+    def embed(self, query: str) -> Optional[np.ndarray]:
+        """Embed a query as a unit-length float32 vector (None when disabled or on failure)"""
+        if not self.enabled:
+            return None
+
+        try:
+            embedding = np.asarray(chroma_db.embed_queries([query])[0], dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"Semantic cache embedding failed: {str(e)}")
+            return None
+
+        norm = float(np.linalg.norm(embedding))
+        return embedding / norm if norm > 0 else embedding
+
+    def lookup(self, doc_id: str, query: str) -> Tuple[Optional[Dict], Optional[np.ndarray]]:
+        """
+        Find a cached answer for a semantically similar query
+        
+        Returns:
+            Tuple of (cached_result or None, query_embedding) so callers can reuse
+            the embedding when storing a fresh answer
+        """
+        embedding = self.embed(query)
+        if embedding is None:
+            return None, None
+
+        with self._lock:
+            entries = self._docs.get(doc_id)
+            if not entries or not entries["results"]:
+                return None, embedding
+
+            similarities = entries["embeddings"] @ embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None, embedding
+
+            self._tick += 1
+            entries["last_used"][best] = self._tick
+            logger.debug(f"Semantic cache hit for doc {doc_id} (similarity={similarities[best]:.3f})")
+            return entries["results"][best], embedding
+
+    def add(self, doc_id: str, embedding: Optional[np.ndarray], result: Dict):
+        """Store an answer under its query embedding, evicting the least recently used entry"""
+        if embedding is None or self.max_entries_per_doc <= 0:
+            return
+
+        with self._lock:
+            self._tick += 1
+            entries = self._docs.setdefault(doc_id, {
+                "embeddings": np.empty((0, embedding.shape[0]), dtype=np.float32),
+                "results": [],
+                "last_used": []
+            })
+
+            if len(entries["results"]) >= self.max_entries_per_doc:
+                victim = int(np.argmin(entries["last_used"]))
+                entries["embeddings"] = np.delete(entries["embeddings"], victim, axis=0)
+                del entries["results"][victim]
+                del entries["last_used"][victim]
+
+            entries["embeddings"] = np.vstack([entries["embeddings"], embedding[None, :]])
+            entries["results"].append(result)
+            entries["last_used"].append(self._tick)
+
+    def invalidate_document(self, doc_id: str):
+        """Drop all cached answers for a document"""
+        with self._lock:
+            self._docs.pop(doc_id, None)
+
+
+# Singleton instances
+response_cache = ResponseCache()
+semantic_cache = SemanticResponseCache()
@@ -1,3 +1,4 @@
+from collections import Counter
 from typing import Dict
 from app.utils.risk_rules import RiskRules
 from app.core.logger import get_logger
@@ -65,19 +66,21 @@ class RiskScorer:
         Returns:
             Dictionary with risk summary statistics
         """
-        high_risk_count = sum(1 for c in scored_clauses.values() if c["risk_level"] == "HIGH")
-        medium_risk_count = sum(1 for c in scored_clauses.values() if c["risk_level"] == "MEDIUM")
-        low_risk_count = sum(1 for c in scored_clauses.values() if c["risk_level"] == "LOW")
-        missing_critical_count = sum(
-            1 for c in scored_clauses.values() 
-            if c.get("reliability_flag") == "MISSING_CRITICAL"
-        )
-        found_count = sum(1 for c in scored_clauses.values() if c["found"])
+        # Tally everything in one pass over the clauses
+        level_counts = Counter()
+        missing_critical_count = 0
+        found_count = 0
+        for c in scored_clauses.values():
+            level_counts[c["risk_level"]] += 1
+            if c.get("reliability_flag") == "MISSING_CRITICAL":
+                missing_critical_count += 1
+            if c["found"]:
+                found_count += 1
         
         summary = {
-            "high_risk_count": high_risk_count,
-            "medium_risk_count": medium_risk_count,
-            "low_risk_count": low_risk_count,
+            "high_risk_count": level_counts["HIGH"],
+            "medium_risk_count": level_counts["MEDIUM"],
+            "low_risk_count": level_counts["LOW"],
             "missing_critical_count": missing_critical_count,
             "found_count": found_count,
             "total_clauses": len(scored_clauses)
@@ -86,3 +89,7 @@ class RiskScorer:
         logger.info(f"Risk summary: {summary}")
         
         return summary
+
+
+# Singleton instance
+risk_scorer = RiskScorer()
@@ -1,6 +1,116 @@
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
 from typing import Dict, Tuple
 import re
 
+# Content patterns used by the rules (compiled once; each is searched once per clause)
+_DOLLAR_AMOUNT_RE = re.compile(r'\$\s*(\d{1,3}(,\d{3})*)')
+_DAYS_RE = re.compile(r'(\d+)\s*days')
+_YEARS_RE = re.compile(r'(\d+)\s*(year|years)')
+
+# Threshold ladders: score = SCORES[bisect(BOUNDS, value)], one bucket per range
+_CAP_AMOUNT_BOUNDS, _CAP_AMOUNT_SCORES = (100000, 1000000), (60, 40, 25)  # <100k, <1M, else
+_TERMINATION_DAYS_BOUNDS, _TERMINATION_DAYS_SCORES = (90, 180), (25, 50, 65)  # <=90, <=180, else
+_RENEWAL_NOTICE_BOUNDS, _RENEWAL_NOTICE_SCORES = (30, 90), (70, 55, 40)  # <30, <90, else
+_NON_COMPETE_YEARS_BOUNDS, _NON_COMPETE_YEARS_SCORES = (1, 3, 5), (50, 40, 60, 80)  # <1, <3, <5, else
+
+# Base risk rules by clause content (text is the clause as extracted, text_lower its lowercase)
+
+def _indemnity_risk(text: str, text_lower: str) -> float:
+    if any(word in text_lower for word in ["unlimited", "uncapped", "all claims", "any and all"]):
+        return 90
+    if "one-sided" in text_lower or "licensee shall indemnify" in text_lower:
+        return 75
+    if "mutual" in text_lower and any(word in text_lower for word in ["reasonable", "limited"]):
+        return 30
+    return 60
+
+
+def _liability_cap_risk(text: str, text_lower: str) -> float:
+    if any(word in text_lower for word in ["no cap", "unlimited", "uncapped"]):
+        return 85
+    amount_match = _DOLLAR_AMOUNT_RE.search(text)  # Has dollar amount
+    if amount_match:
+        amount = int(amount_match.group(1).replace(',', ''))
+        return _CAP_AMOUNT_SCORES[bisect_right(_CAP_AMOUNT_BOUNDS, amount)]
+    return 50
+
+
+def _uncapped_liability_risk(text: str, text_lower: str) -> float:
+    return 90  # Always high risk if found
+
+
+def _termination_risk(text: str, text_lower: str) -> float:
+    if "no termination" in text_lower or "cannot terminate" in text_lower:
+        return 80
+    days_match = _DAYS_RE.search(text_lower)
+    if days_match:
+        days = int(days_match.group(1))
+        return _TERMINATION_DAYS_SCORES[bisect_left(_TERMINATION_DAYS_BOUNDS, days)]
+    return 55
+
+
+def _renewal_risk(text: str, text_lower: str) -> float:
+    if "auto" in text_lower or "automatic" in text_lower:
+        if "notice" in text_lower:
+            days_match = _DAYS_RE.search(text_lower)
+            if days_match:
+                days = int(days_match.group(1))
+                return _RENEWAL_NOTICE_SCORES[bisect_right(_RENEWAL_NOTICE_BOUNDS, days)]
+        return 70
+    return 20
+
+
+def _ip_ownership_risk(text: str, text_lower: str) -> float:
+    if any(word in text_lower for word in ["customer loses", "vendor owns all", "exclusive ownership"]):
+        return 85
+    if "unclear" in text_lower or "ambiguous" in text_lower:
+        return 60
+    if "customer retains" in text_lower or "licensee owns" in text_lower:
+        return 20
+    return 50
+
+
+def _non_compete_risk(text: str, text_lower: str) -> float:
+    years_match = _YEARS_RE.search(text_lower)
+    if years_match:
+        return _NON_COMPETE_YEARS_SCORES[bisect_right(_NON_COMPETE_YEARS_BOUNDS, int(years_match.group(1)))]
+    return 50
+
+
+def _audit_rights_risk(text: str, text_lower: str) -> float:
+    if "unlimited" in text_lower or "at any time" in text_lower:
+        return 65
+    if "no audit" in text_lower:
+        return 55
+    return 25
+
+
+def _governing_law_risk(text: str, text_lower: str) -> float:
+    unfavorable_jurisdictions = ["cayman", "bermuda", "offshore"]
+    if any(jurisdiction in text_lower for jurisdiction in unfavorable_jurisdictions):
+        return 50
+    return 15
+
+
+# Rules for exact clause types, looked up in one dict probe
+_BASE_RISK_RULES = {
+    "Indemnity": _indemnity_risk,
+    "Cap On Liability": _liability_cap_risk,
+    "Uncapped Liability": _uncapped_liability_risk,
+    "Termination For Convenience": _termination_risk,
+    "Non-Compete": _non_compete_risk,
+    "Audit Rights": _audit_rights_risk,
+    "Governing Law": _governing_law_risk,
+}
+
+# Rules for clause type families, checked in order when there is no exact rule
+_BASE_RISK_FAMILY_RULES = (
+    ("Renewal", _renewal_risk),
+    ("IP Ownership", _ip_ownership_risk),
+)
+
+
 class RiskRules:
     """
     Industry-standard risk assessment rules for contract clauses
@@ -67,9 +177,20 @@ class RiskRules:
             Tuple of (risk_score, risk_level, reliability_flag)
         """
         # If clause not found
-        if not extracted_text or extracted_text.strip() == "":
+        if not extracted_text or extracted_text.isspace():
             return RiskRules._assess_missing_clause(clause_type)
         
+        # Confidence only matters through the low-confidence threshold, so the memoized
+        # assessment is keyed on that rather than on the raw score
+        return RiskRules._assess_found_clause(clause_type, extracted_text, confidence < 0.6)
+    
+    @staticmethod
+    @lru_cache(maxsize=2048)
+    def _assess_found_clause(clause_type: str, extracted_text: str, low_confidence: bool) -> Tuple[float, str, str]:
+        """
+        Assess risk for a found clause (memoized: re-analyzed documents and shared contract
+        templates re-score the same clause text)
+        """
         # Assess based on clause type and content
         base_risk = RiskRules._calculate_base_risk(clause_type, extracted_text)
         importance = RiskRules.IMPORTANCE_WEIGHTS.get(clause_type, 0.5)
@@ -87,7 +208,7 @@ class RiskRules:
         
         # Reliability flag for low confidence on high-risk clauses
         reliability_flag = None
-        if confidence < 0.6 and final_risk >= 60:
+        if low_confidence and final_risk >= 60:
             reliability_flag = "REQUIRES_HUMAN_VERIFICATION"
         
         return round(final_risk, 2), risk_level, reliability_flag
@@ -105,109 +226,17 @@ class RiskRules:
     @staticmethod
     def _calculate_base_risk(clause_type: str, text: str) -> float:
         """Calculate base risk score based on clause content patterns"""
-        text_lower = text.lower()
-        
-        # Indemnity clause rules
-        if clause_type == "Indemnity":
-            if any(word in text_lower for word in ["unlimited", "uncapped", "all claims", "any and all"]):
-                return 90
-            if "one-sided" in text_lower or "licensee shall indemnify" in text_lower:
-                return 75
-            if "mutual" in text_lower and any(word in text_lower for word in ["reasonable", "limited"]):
-                return 30
-            return 60
-        
-        # Liability cap rules
-        if clause_type == "Cap On Liability":
-            if any(word in text_lower for word in ["no cap", "unlimited", "uncapped"]):
-                return 85
-            if re.search(r'\$\s*\d{1,3}(,\d{3})*', text):  # Has dollar amount
-                amount_match = re.search(r'\$\s*(\d{1,3}(,\d{3})*)', text)
-                if amount_match:
-                    amount = int(amount_match.group(1).replace(',', ''))
-                    if amount < 100000:
-                        return 60
-                    elif amount < 1000000:
-                        return 40
-                    else:
-                        return 25
-            return 50
-        
-        # Uncapped liability
-        if clause_type == "Uncapped Liability":
-            return 90  # Always high risk if found
-        
-        # Termination rules
-        if clause_type == "Termination For Convenience":
-            if "no termination" in text_lower or "cannot terminate" in text_lower:
-                return 80
-            if re.search(r'(\d+)\s*days', text_lower):
-                days_match = re.search(r'(\d+)\s*days', text_lower)
-                days = int(days_match.group(1))
-                if days > 180:
-                    return 65
-                elif days > 90:
-                    return 50
-                else:
-                    return 25
-            return 55
-        
-        # Auto-renewal rules
-        if "Renewal" in clause_type:
-            if "auto" in text_lower or "automatic" in text_lower:
-                if "notice" in text_lower:
-                    if re.search(r'(\d+)\s*days', text_lower):
-                        days_match = re.search(r'(\d+)\s*days', text_lower)
-                        days = int(days_match.group(1))
-                        if days < 30:
-                            return 70
-                        elif days < 90:
-                            return 55
-                        else:
-                            return 40
-                return 70
-            return 20
-        
-        # IP ownership rules
-        if "IP Ownership" in clause_type:
-            if any(word in text_lower for word in ["customer loses", "vendor owns all", "exclusive ownership"]):
-                return 85
-            if "unclear" in text_lower or "ambiguous" in text_lower:
-                return 60
-            if "customer retains" in text_lower or "licensee owns" in text_lower:
-                return 20
-            return 50
-        
-        # Non-compete rules
-        if clause_type == "Non-Compete":
-            if re.search(r'(\d+)\s*(year|years)', text_lower):
-                years_match = re.search(r'(\d+)\s*(year|years)', text_lower)
-                years = int(years_match.group(1))
-                if years >= 5:
-                    return 80
-                elif years >= 3:
-                    return 60
-                elif years >= 1:
-                    return 40
-            return 50
-        
-        # Audit rights rules
-        if clause_type == "Audit Rights":
-            if "unlimited" in text_lower or "at any time" in text_lower:
-                return 65
-            if "no audit" in text_lower:
-                return 55
-            return 25
-        
-        # Governing law rules
-        if clause_type == "Governing Law":
-            unfavorable_jurisdictions = ["cayman", "bermuda", "offshore"]
-            if any(jurisdiction in text_lower for jurisdiction in unfavorable_jurisdictions):
-                return 50
-            return 15
-        
-        # Default risk for other clauses
-        return 40
+        rule = _BASE_RISK_RULES.get(clause_type)
+        if rule is None:
+            rule = next(
+                (family_rule for family, family_rule in _BASE_RISK_FAMILY_RULES if family in clause_type),
+                None
+            )
+        if rule is None:
+            # Default risk for other clauses (no content rules, so the text is never lowercased)
+            return 40
+        
+        return rule(text, text.lower())
     
     @staticmethod
     def calculate_overall_risk(clause_risks: Dict[str, Dict]) -> float:
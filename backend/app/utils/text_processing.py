@@ -1,11 +1,38 @@
 import re
-from typing import List, Tuple
+from array import array
+from bisect import bisect_right
+from typing import List, Optional, Tuple
 from app.core.logger import get_logger
 from typing import List, Dict
 
 
 logger = get_logger(__name__)
 
+# Cleaning and section patterns, compiled once at import instead of per page
+# Two passes in order: once "Page N of M" is removed, a "Page N" glued to it (a footer
+# running into the next page's header) gains the word boundary the second pass needs
+_PAGE_OF_RE = re.compile(r'Page\s+\d+\s+of\s+\d+', re.IGNORECASE)
+_PAGE_NUMBER_RE = re.compile(r'\bPage\s+\d+\b', re.IGNORECASE)
+# Once whitespace is collapsed a page has no line breaks left, so the header/footer rule
+# patterns (^\s*-+\s*$ and ^\s*=+\s*$) can only ever match a page that is nothing but a rule
+_RULE_ONLY_RE = re.compile(r'\s*(?:-+|=+)\s*')
+# Curly quotes to straight quotes and zero-width characters dropped. All are non-ASCII,
+# so ASCII pages skip the table entirely; otherwise a C-level `in` scan gates each
+# replace (str.translate with non-ASCII mappings runs a per-character lookup, ~15x slower)
+_CHAR_NORMALIZATION = (
+    ('\u201c', '"'), ('\u201d', '"'),
+    ('\u2018', "'"), ('\u2019', "'"),
+    ('\u200b', ''), ('\u200c', ''), ('\u200d', ''), ('\ufeff', ''),
+)
+
+# Joins pages for batch cleaning; the page-marker patterns can neither match nor cross it
+_PAGE_SEPARATOR = '\x00'
+
+_SECTION_PATTERNS = (
+    re.compile(r'(?:Section|SECTION|Article|ARTICLE)\s+(\d+\.?\d*)\s*[:\.\-]?\s*([^\n]+)'),
+    re.compile(r'(\d+\.?\d*)\s*\.\s*([A-Z][^\n]+)'),
+)
+
 class TextProcessor:
     """Utility class for text preprocessing and chunking"""
     
@@ -21,26 +48,11 @@ class TextProcessor:
             Cleaned text
         """
         try:
-            # Remove excessive whitespace
-            text = re.sub(r'\s+', ' ', text)
-            
             # Remove page numbers (common patterns)
-            text = re.sub(r'Page\s+\d+\s+of\s+\d+', '', text, flags=re.IGNORECASE)
-            text = re.sub(r'\bPage\s+\d+\b', '', text, flags=re.IGNORECASE)
+            text = _PAGE_OF_RE.sub('', text)
+            text = _PAGE_NUMBER_RE.sub('', text)
             
-            # Remove common header/footer artifacts
-            text = re.sub(r'^\s*-+\s*$', '', text, flags=re.MULTILINE)
-            text = re.sub(r'^\s*=+\s*$', '', text, flags=re.MULTILINE)
-            
-            # Normalize quotes
-            text = text.replace('"', '"').replace('"', '"')
-            text = text.replace(''', "'").replace(''', "'")
-            
-            # Remove zero-width characters
-            text = re.sub(r'[\u200b\u200c\u200d\ufeff]', '', text)
-            
-            # Strip and ensure single spacing
-            text = ' '.join(text.split())
+            text = TextProcessor._normalize_page(text)
             
             logger.debug(f"Cleaned text: {len(text)} characters")
             return text
@@ -49,6 +61,46 @@ class TextProcessor:
             logger.error(f"Error cleaning text: {str(e)}")
             return text
     
+    @staticmethod
+    def _normalize_page(text: str) -> str:
+        """Drop rule-only pages, normalize quotes, remove zero-width chars, single-space"""
+        # Remove common header/footer artifacts
+        if _RULE_ONLY_RE.fullmatch(text):
+            return ''
+        
+        # Normalize quotes and remove zero-width characters, then strip and ensure single spacing
+        if not text.isascii():
+            for char, replacement in _CHAR_NORMALIZATION:
+                if char in text:
+                    text = text.replace(char, replacement)
+        return ' '.join(text.split())
+    
+    @staticmethod
+    def clean_pages(pages: List[str]) -> List[str]:
+        """
+        Clean a list of page texts, identical to calling clean_text on each page
+        
+        The pages are joined with a separator so the page-marker patterns run once over
+        the whole document instead of once per page, then split back apart.
+        
+        Args:
+            pages: Raw text of each page
+        
+        Returns:
+            Cleaned text of each page (same length and order as pages)
+        """
+        if not pages or any(_PAGE_SEPARATOR in page for page in pages):
+            return [TextProcessor.clean_text(page) for page in pages]
+        
+        try:
+            text = _PAGE_OF_RE.sub('', _PAGE_SEPARATOR.join(pages))
+            text = _PAGE_NUMBER_RE.sub('', text)
+            return [TextProcessor._normalize_page(page) for page in text.split(_PAGE_SEPARATOR)]
+        
+        except Exception as e:
+            logger.error(f"Error cleaning pages: {str(e)}")
+            return [TextProcessor.clean_text(page) for page in pages]
+    
     @staticmethod
     def extract_sections(text: str) -> List[Tuple[str, str]]:
         """
@@ -63,13 +115,8 @@ class TextProcessor:
         sections = []
         
         # Common section patterns
-        patterns = [
-            r'(?:Section|SECTION|Article|ARTICLE)\s+(\d+\.?\d*)\s*[:\.\-]?\s*([^\n]+)',
-            r'(\d+\.?\d*)\s*\.\s*([A-Z][^\n]+)',
-        ]
-        
-        for pattern in patterns:
-            matches = re.finditer(pattern, text)
+        for pattern in _SECTION_PATTERNS:
+            matches = pattern.finditer(text)
             for match in matches:
                 section_num = match.group(1)
                 section_title = match.group(2).strip()
@@ -92,26 +139,104 @@ class TextProcessor:
         
         Returns:
             List of chunk dictionaries with metadata
+        
+        Raises:
+            ValueError: If overlap is not smaller than chunk_size (windows would never advance)
         """
-        chunks = []
+        if chunk_size <= overlap:
+            raise ValueError(f"chunk_size ({chunk_size}) must be greater than overlap ({overlap})")
+        
         text_length = len(text)
-        start = 0
-        chunk_id = 0
         
-        while start < text_length:
-            end = min(start + chunk_size, text_length)
-            chunk_text = text[start:end]
-            
-            chunks.append({
+        # Window starts come from range() in C; ends are clipped at the text length
+        chunks = [
+            {
                 "chunk_id": chunk_id,
-                "text": chunk_text,
+                "text": text[start:end],
                 "char_start": start,
                 "char_end": end,
-                "length": len(chunk_text)
-            })
-            
-            start += (chunk_size - overlap)
-            chunk_id += 1
+                "length": end - start
+            }
+            for chunk_id, start in enumerate(range(0, text_length, chunk_size - overlap))
+            for end in (min(start + chunk_size, text_length),)
+        ]
         
         logger.info(f"Created {len(chunks)} chunks from text ({text_length} characters)")
         return chunks
+    
+    @staticmethod
+    def split_on_boundaries(text: str, chunk_size: int, overlap: int,
+                            separators: Tuple[str, ...] = ("\n\n", "\n", ". ", "; ", " ")) -> List[Tuple[int, int]]:
+        """
+        Split text into overlapping windows that end on the highest-priority separator
+        found in the second half of each window (paragraph, line, sentence, clause, word)
+        
+        Args:
+            text: Text to split
+            chunk_size: Maximum characters per chunk
+            overlap: Approximate number of overlapping characters
+            separators: Boundaries to cut on, in priority order
+        
+        Returns:
+            List of (char_start, char_end) spans
+        """
+        spans = []
+        text_length = len(text)
+        start = 0
+        
+        while start < text_length:
+            end = min(start + chunk_size, text_length)
+            
+            if end < text_length:
+                for separator in separators:
+                    cut = text.rfind(separator, start + chunk_size // 2, end)
+                    if cut != -1:
+                        end = cut + len(separator)
+                        break
+            
+            spans.append((start, end))
+            if end >= text_length:
+                break
+            
+            # Start the next window on a word boundary inside the overlap
+            next_start = max(end - overlap, start + 1)
+            space = text.find(" ", next_start, end)
+            start = space + 1 if space != -1 else next_start
+        
+        return spans
+
+
+class PageMap:
+    """
+    Character-offset to page-number lookup for extracted contract text
+    Stores one end offset per page in a contiguous int array and resolves positions
+    with a binary search instead of keeping one dict entry per character
+    """
+    
+    def __init__(self):
+        self.page_ends = array('i')
+        self.page_numbers = array('i')
+    
+    def add_page(self, page_number: int, end_offset: int):
+        """Record that text up to end_offset (exclusive) belongs to page_number"""
+        self.page_ends.append(end_offset)
+        self.page_numbers.append(page_number)
+    
+    def page_of(self, pos: int) -> Optional[int]:
+        """
+        Page number containing a character position
+        
+        Args:
+            pos: Character offset into the extracted text
+        
+        Returns:
+            1-based page number, or None if pos is outside the text
+        """
+        idx = bisect_right(self.page_ends, pos)
+        if pos < 0 or idx >= len(self.page_ends):
+            return None
+        return self.page_numbers[idx]
+    
+    def __len__(self) -> int:
+        """Number of characters covered by the mapping"""
+        return self.page_ends[-1] if self.page_ends else 0
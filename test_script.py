@@ -23,6 +23,7 @@ print("\n✅ All files renamed! You can now run your test_script.py")"""
 
 import torch
 import numpy as np
+from heapq import nlargest
 from transformers import AutoTokenizer, AutoModelForQuestionAnswering
 from typing import List, Dict
 
@@ -37,14 +38,69 @@ STRIDE = 128
 N_BEST = 5
 MAX_ANSWER_LENGTH = 40
 NULL_THRESHOLD = 0.0  # conservative; tune later if needed
+BATCH_SIZE = 16  # windows per forward pass, across all questions
+# INT8 dynamic quantization of the Linear layers on CPU, as the backend extractor serves it
+QUANTIZE_INT8 = DEVICE == "cpu"
+# Run an ONNX export from MODEL_PATH through ONNX Runtime when one exists (see README)
+USE_ONNX = os.getenv("USE_ONNX", "true").lower() == "true"
 
 # ---------------------------------------------------------
 # LOAD MODEL + TOKENIZER
 # ---------------------------------------------------------
 tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
-model = AutoModelForQuestionAnswering.from_pretrained(MODEL_PATH)
-model.to(DEVICE)
-model.eval()
+
+
+def load_onnx_session():
+    """ONNX Runtime session over model_quantized.onnx / model.onnx in MODEL_PATH, or None"""
+    if not USE_ONNX:
+        return None
+
+    onnx_path = next(
+        (path for path in (os.path.join(MODEL_PATH, name) for name in ("model_quantized.onnx", "model.onnx"))
+         if os.path.exists(path)),
+        None
+    )
+    if onnx_path is None:
+        return None
+
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        print(f"Found {onnx_path} but onnxruntime is not installed; using PyTorch")
+        return None
+
+    # Fused, shape-specialized kernels (attention, LayerNorm, GELU); inputs are always
+    # padded to MAX_LENGTH so every run hits the same shapes
+    sess_options = ort.SessionOptions()
+    sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    print(f"Using ONNX Runtime model {onnx_path}")
+    return ort.InferenceSession(onnx_path, sess_options=sess_options, providers=["CPUExecutionProvider"])
+
+
+ort_session = load_onnx_session()
+model = None
+if ort_session is None:
+    model = AutoModelForQuestionAnswering.from_pretrained(MODEL_PATH)
+    model.eval()
+    if QUANTIZE_INT8:
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    model.to(DEVICE)
+
+
+def run_model(input_ids: torch.Tensor, attention_mask: torch.Tensor):
+    """Start and end logits for a batch of windows, as numpy arrays"""
+    if ort_session is not None:
+        input_names = {inp.name for inp in ort_session.get_inputs()}
+        feeds = {"input_ids": input_ids.numpy(), "attention_mask": attention_mask.numpy()}
+        start_logits, end_logits = ort_session.run(
+            ["start_logits", "end_logits"],
+            {name: value for name, value in feeds.items() if name in input_names}
+        )
+        return start_logits, end_logits
+
+    with torch.inference_mode():
+        outputs = model(input_ids=input_ids.to(DEVICE), attention_mask=attention_mask.to(DEVICE))
+    return outputs.start_logits.cpu().numpy(), outputs.end_logits.cpu().numpy()
 
 # ---------------------------------------------------------
 # SAMPLE CONTRACT PARAGRAPH (REALISTIC LEGAL STYLE)
@@ -85,12 +141,78 @@ questions = [
 ]
 
 # ---------------------------------------------------------
-# CORE QA INFERENCE FUNCTION
+# CORE QA INFERENCE FUNCTIONS
 # ---------------------------------------------------------
-def answer_question(question: str, context: str) -> List[Dict]:
+def top_indexes(logits: np.ndarray, k: int) -> np.ndarray:
+    """Indexes of the k largest logits, ordered from smallest to largest logit"""
+    k = min(k, len(logits))
+    top = np.argpartition(logits, len(logits) - k)[len(logits) - k:]
+    return top[np.argsort(logits[top], kind="stable")]
+
+
+def extract_spans(start_logits: np.ndarray, end_logits: np.ndarray, offsets, context: str) -> List[Dict]:
+    """Candidate answer spans of one window that beat its null (CLS) score"""
+    answers = []
+
+    # Null score (CLS token)
+    null_score = start_logits[0] + end_logits[0]
+
+    # Top candidate spans (argpartition picks the top N_BEST in linear time; they are then
+    # ordered lowest to highest, as argsort()[-N_BEST:] listed them)
+    start_indexes = top_indexes(start_logits, N_BEST)
+    end_indexes = top_indexes(end_logits, N_BEST)
+
+    # Score and validate all N_BEST x N_BEST (start, end) pairs at once
+    scores = start_logits[start_indexes][:, None] + end_logits[end_indexes][None, :]
+    lengths = end_indexes[None, :] - start_indexes[:, None] + 1
+    valid = (lengths >= 1) & (lengths <= MAX_ANSWER_LENGTH) & (scores > null_score + NULL_THRESHOLD)
+
+    for i, j in zip(*np.nonzero(valid)):
+        start, end = start_indexes[i], end_indexes[j]
+        if offsets[start] is None or offsets[end] is None:
+            continue
+
+        start_char = offsets[start][0]
+        end_char = offsets[end][1]
+        text = context[start_char:end_char].strip()
+
+        if not text:
+            continue
+
+        answers.append({
+            "text": text,
+            "score": float(scores[i, j])
+        })
+
+    return answers
+
+
+def rank_answers(answers: List[Dict]) -> List[Dict]:
+    """Deduplicate spans by text (keeping the best score) and return the top 3"""
+    unique = {}
+    for ans in answers:
+        best = unique.get(ans["text"])
+        if best is None or ans["score"] > best:
+            unique[ans["text"]] = ans["score"]
+
+    # top-3 answers max; nlargest orders (and breaks ties) exactly like sorted(reverse=True)[:3]
+    return [
+        {"text": k, "score": v}
+        for k, v in nlargest(3, unique.items(), key=lambda x: x[1])
+    ]
+
+
+def answer_questions(questions: List[str], context: str) -> List[List[Dict]]:
+    """
+    Answer several questions over the same context with batched forward passes
+
+    Every (question, context window) row is tokenized in one call and the windows of all
+    questions go through the model BATCH_SIZE at a time; overflow_to_sample_mapping
+    routes each window's spans back to its question.
+    """
     inputs = tokenizer(
-        question,
-        context,
+        questions,
+        [context] * len(questions),
         max_length=MAX_LENGTH,
         stride=STRIDE,
         truncation="only_second",
@@ -99,62 +221,31 @@ def answer_question(question: str, context: str) -> List[Dict]:
         padding="max_length",
         return_tensors="pt"
     )
+    sample_mapping = inputs["overflow_to_sample_mapping"].tolist()
 
-    answers = []
+    start_batches, end_batches = [], []
+    for b in range(0, len(inputs["input_ids"]), BATCH_SIZE):
+        start_logits, end_logits = run_model(
+            inputs["input_ids"][b:b + BATCH_SIZE],
+            inputs["attention_mask"][b:b + BATCH_SIZE]
+        )
+        start_batches.append(start_logits)
+        end_batches.append(end_logits)
 
-    for i in range(len(inputs["input_ids"])):
-        input_ids = inputs["input_ids"][i].unsqueeze(0).to(DEVICE)
-        attention_mask = inputs["attention_mask"][i].unsqueeze(0).to(DEVICE)
-        offsets = inputs["offset_mapping"][i]
-
-        with torch.no_grad():
-            outputs = model(input_ids=input_ids, attention_mask=attention_mask)
-
-        start_logits = outputs.start_logits[0].cpu().numpy()
-        end_logits = outputs.end_logits[0].cpu().numpy()
-
-        # Null score (CLS token)
-        null_score = start_logits[0] + end_logits[0]
-
-        # Top candidate spans
-        start_indexes = np.argsort(start_logits)[-N_BEST:]
-        end_indexes = np.argsort(end_logits)[-N_BEST:]
-
-        for start in start_indexes:
-            for end in end_indexes:
-                if end < start:
-                    continue
-                length = end - start + 1
-                if length > MAX_ANSWER_LENGTH:
-                    continue
-                if offsets[start] is None or offsets[end] is None:
-                    continue
-
-                start_char = offsets[start][0]
-                end_char = offsets[end][1]
-                text = context[start_char:end_char].strip()
-
-                if not text:
-                    continue
-
-                score = start_logits[start] + end_logits[end]
-                if score > null_score + NULL_THRESHOLD:
-                    answers.append({
-                        "text": text,
-                        "score": float(score)
-                    })
-
-    # Deduplicate & sort
-    unique = {}
-    for ans in answers:
-        unique[ans["text"]] = max(unique.get(ans["text"], -1), ans["score"])
+    start_logits = np.concatenate(start_batches)
+    end_logits = np.concatenate(end_batches)
 
-    results = [
-        {"text": k, "score": v}
-        for k, v in sorted(unique.items(), key=lambda x: x[1], reverse=True)
-    ]
+    answers = [[] for _ in questions]
+    for i, question_idx in enumerate(sample_mapping):
+        answers[question_idx].extend(
+            extract_spans(start_logits[i], end_logits[i], inputs["offset_mapping"][i], context)
+        )
+
+    return [rank_answers(question_answers) for question_answers in answers]
 
-    return results[:3]  # top-3 answers max
+
+def answer_question(question: str, context: str) -> List[Dict]:
+    return answer_questions([question], context)[0]
 
 
 # ---------------------------------------------------------
@@ -163,9 +254,10 @@ def answer_question(question: str, context: str) -> List[Dict]:
 if __name__ == "__main__":
     print("\n================ CONTRACT CLAUSE EXTRACTION ================\n")
 
-    for q in questions:
+    all_preds = answer_questions(questions, context)
+
+    for q, preds in zip(questions, all_preds):
         print(f"❓ QUESTION: {q}")
-        preds = answer_question(q, context)
 
         if len(preds) == 0:
             print("   ➤ No answer found.\n")